@@ -0,0 +1,78 @@
+"""
+Micro-benchmark for services.chunker on multi-MB documents.
+
+    cd backend && python -m benchmarks.bench_chunker --size-mb 8
+"""
+import argparse
+import random
+import time
+from typing import Iterator
+
+from services.chunker import count_tokens, iter_chunks
+
+WORDS = (
+    "the system shall retry failed requests within thirty seconds of the original attempt "
+    "refund policy applies to orders PN-4711 and SKU-2048 placed before the cutoff date "
+    "quarterly revenue grew while operating costs remained flat across all regions"
+).split()
+
+
+def make_document(size_bytes: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    section = 0
+    while total < size_bytes:
+        if rng.random() < 0.05:
+            section += 1
+            block = f"## Section {section}"
+        else:
+            sentences = [
+                " ".join(rng.choices(WORDS, k=rng.randint(6, 30))).capitalize() + "."
+                for _ in range(rng.randint(1, 12))
+            ]
+            block = " ".join(sentences)
+        parts.append(block)
+        total += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def stream(text: str, piece_size: int) -> Iterator[str]:
+    for start in range(0, len(text), piece_size):
+        yield text[start:start + piece_size]
+
+
+def run(label: str, source, size_bytes: int, max_tokens: int, overlap: int) -> None:
+    start = time.perf_counter()
+    chunks = 0
+    tokens = 0
+    largest = 0
+    for chunk in iter_chunks(source, max_tokens, overlap):
+        n = count_tokens(chunk)
+        chunks += 1
+        tokens += n
+        largest = max(largest, n)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<10} {elapsed:7.3f}s  {size_bytes / elapsed / 1e6:6.2f} MB/s  "
+        f"{chunks:7d} chunks  avg {tokens / max(chunks, 1):6.1f} tok  max {largest} tok"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=4.0)
+    parser.add_argument("--max-tokens", type=int, default=400)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--piece-kb", type=int, default=64, help="piece size for the streaming run")
+    args = parser.parse_args()
+
+    text = make_document(int(args.size_mb * 1024 * 1024))
+    size = len(text.encode("utf-8"))
+    print(f"document: {size / 1e6:.2f} MB, max_tokens={args.max_tokens}, overlap={args.overlap}")
+    run("string", text, size, args.max_tokens, args.overlap)
+    run("streamed", stream(text, args.piece_kb * 1024), size, args.max_tokens, args.overlap)
+
+
+if __name__ == "__main__":
+    main()
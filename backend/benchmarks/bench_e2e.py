@@ -0,0 +1,303 @@
+"""
+End-to-end benchmark for the upload and ask endpoints, without API keys.
+
+Gemini is replaced by a deterministic fake with fixed latency, the vector
+store is either the local memmap store or an in-memory Qdrant, and the
+FastAPI app is driven in-process over ASGI with configurable concurrency.
+
+    cd backend && python -m benchmarks.bench_e2e --docs 40 --asks 200 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import numpy as np
+
+from benchmarks.bench_chunker import WORDS, make_document
+
+VECTOR_SIZE = 768
+_WORD_RE = re.compile(r"\w+")
+
+
+def fake_vector(text: str) -> List[float]:
+    """Hashed bag of words, so texts sharing words land close together."""
+    vec = np.zeros(VECTOR_SIZE, dtype=np.float32)
+    for word in _WORD_RE.findall(text.lower()):
+        vec[zlib.crc32(word.encode("utf-8")) % VECTOR_SIZE] += 1.0
+    norm = float(np.linalg.norm(vec))
+    if norm == 0:
+        vec[0] = 1.0
+        norm = 1.0
+    return (vec / norm).tolist()
+
+
+def _answer_json(contents: Any) -> str:
+    return json.dumps({
+        "answer": "The documents describe the retry and refund policies.",
+        "confidence": 0.9,
+        "citations": [],
+        "needs_human_review": False,
+        "followup_question": "",
+    })
+
+
+class FakeModels:
+    """Stand-in for genai ``client.models`` with fixed per-call latency."""
+
+    def __init__(self, embed_latency: float, generate_latency: float):
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+
+    def embed_content(self, model: str, contents: List[str], config: Any = None) -> Any:
+        time.sleep(self.embed_latency)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_vector(t)) for t in contents])
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        time.sleep(self.generate_latency)
+        return SimpleNamespace(text=_answer_json(contents))
+
+
+class FakeAsyncModels(FakeModels):
+    """Stand-in for genai ``client.aio.models``."""
+
+    async def embed_content(self, model: str, contents: List[str], config: Any = None) -> Any:
+        await asyncio.sleep(self.embed_latency)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_vector(t)) for t in contents])
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None) -> Any:
+        await asyncio.sleep(self.generate_latency)
+        return SimpleNamespace(text=_answer_json(contents))
+
+    async def generate_content_stream(self, model: str, contents: Any, config: Any = None) -> Any:
+        parts = [
+            "The documents describe ",
+            "the retry and refund policies.\n###METADATA###\n",
+            json.dumps({"confidence": 0.9, "citations": [], "followup_question": ""}),
+        ]
+
+        async def stream():
+            for part in parts:
+                await asyncio.sleep(self.generate_latency / len(parts))
+                yield SimpleNamespace(text=part)
+
+        return stream()
+
+
+def fake_genai_client(embed_latency: float, generate_latency: float) -> Any:
+    return SimpleNamespace(
+        models=FakeModels(embed_latency, generate_latency),
+        aio=SimpleNamespace(models=FakeAsyncModels(embed_latency, generate_latency)),
+    )
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run_uploads(client: Any, args: argparse.Namespace) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(args.upload_concurrency)
+    latencies: List[float] = []
+    chunks = 0
+    errors = 0
+
+    async def upload(batch: int) -> None:
+        nonlocal chunks, errors
+        first = batch * args.files_per_upload
+        files = []
+        for i in range(first, min(first + args.files_per_upload, args.docs)):
+            text = make_document(args.doc_kb * 1024, seed=i)
+            files.append(("files", (f"doc-{i}.txt", text.encode("utf-8"), "text/plain")))
+        workspace = f"bench-{batch % args.workspaces}"
+        async with sem:
+            start = time.perf_counter()
+            resp = await client.post(f"/api/workspaces/{workspace}/upload?wait=true", files=files)
+            latencies.append(time.perf_counter() - start)
+        if resp.status_code != 200 or resp.json().get("errors"):
+            errors += 1
+        else:
+            chunks += resp.json().get("chunks_indexed", 0)
+
+    batches = (args.docs + args.files_per_upload - 1) // args.files_per_upload
+    start = time.perf_counter()
+    await asyncio.gather(*(upload(b) for b in range(batches)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": batches,
+        "errors": errors,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "chunks_per_sec": chunks / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def run_asks(client: Any, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    questions = [
+        (f"bench-{i % args.workspaces}", f"q{i} " + " ".join(rng.choices(WORDS, k=6)) + "?")
+        for i in range(args.asks)
+    ]
+    path = "ask/stream" if args.stream else "ask"
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def ask(workspace: str, question: str) -> None:
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            if args.stream:
+                async with client.stream(
+                    "POST", f"/api/workspaces/{workspace}/{path}", json={"question": question}
+                ) as resp:
+                    # ASGITransport buffers the body, so this times the whole
+                    # stream rather than the first token
+                    ok = resp.status_code == 200
+                    async for line in resp.aiter_lines():
+                        if line == "event: error":
+                            ok = False
+            else:
+                resp = await client.post(f"/api/workspaces/{workspace}/{path}", json={"question": question})
+                ok = resp.status_code == 200
+            latencies.append(time.perf_counter() - start)
+        if not ok:
+            errors += 1
+
+    async def ask_batch(workspace: str, batch: List[str]) -> None:
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            resp = await client.post(f"/api/workspaces/{workspace}/ask/batch", json={"questions": batch})
+            latencies.append(time.perf_counter() - start)
+        if resp.status_code != 200:
+            errors += len(batch)
+        else:
+            errors += sum(1 for item in resp.json()["results"] if "error" in item)
+
+    start = time.perf_counter()
+    if args.batch:
+        by_workspace: Dict[str, List[str]] = {}
+        for workspace, question in questions:
+            by_workspace.setdefault(workspace, []).append(question)
+        await asyncio.gather(*(
+            ask_batch(workspace, qs[i:i + args.batch])
+            for workspace, qs in by_workspace.items()
+            for i in range(0, len(qs), args.batch)
+        ))
+    else:
+        await asyncio.gather(*(ask(w, q) for w, q in questions))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(questions),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_sec": len(questions) / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+
+    import main as app_module
+    from services.qdrant_client import QdrantVectorStore
+    from services.vector_store import LocalVectorStore, set_vector_store
+
+    if args.store == "qdrant":
+        set_vector_store(QdrantVectorStore(path=":memory:"))
+    else:
+        set_vector_store(LocalVectorStore(os.environ["LOCAL_VECTOR_DIR"]))
+    app_module.gemini_client.client = fake_genai_client(args.embed_latency_ms / 1000, args.generate_latency_ms / 1000)
+
+    app = app_module.app
+    async with app_module.lifespan(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            upload = await run_uploads(client, args)
+            upload["peak_rss_mb"] = peak_rss_mb()
+            ask = await run_asks(client, args)
+            ask["peak_rss_mb"] = peak_rss_mb()
+    return {"config": vars(args), "upload": upload, "ask": ask}
+
+
+def report(results: Dict[str, Any]) -> None:
+    for name in ("upload", "ask"):
+        r = results[name]
+        lat = r["latency_ms"]
+        rate = (
+            f"{r['chunks_per_sec']:8.1f} chunks/s" if name == "upload"
+            else f"{r['requests_per_sec']:8.1f} req/s   "
+        )
+        print(
+            f"{name:<7} {r['requests']:5d} req  {r['errors']:3d} err  {r['seconds']:7.2f}s  {rate}  "
+            f"p50 {lat['p50']:7.1f}ms  p95 {lat['p95']:7.1f}ms  p99 {lat['p99']:7.1f}ms  "
+            f"rss {r['peak_rss_mb']:6.1f} MB"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40)
+    parser.add_argument("--doc-kb", type=int, default=64)
+    parser.add_argument("--files-per-upload", type=int, default=5)
+    parser.add_argument("--upload-concurrency", type=int, default=4)
+    parser.add_argument("--workspaces", type=int, default=2)
+    parser.add_argument("--asks", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--stream", action="store_true", help="use the SSE ask endpoint")
+    parser.add_argument(
+        "--batch", type=int, default=0,
+        help="send questions to the batch ask endpoint in groups of this size (latency is then per batch)",
+    )
+    parser.add_argument("--store", choices=("local", "qdrant"), default="local")
+    parser.add_argument("--embed-latency-ms", type=float, default=50)
+    parser.add_argument("--generate-latency-ms", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-e2e-") as tmp:
+        # Point every on-disk store at a scratch directory before the app is imported
+        for key, name in (
+            ("CHUNK_STORE_PATH", "chunks.sqlite3"),
+            ("CONTENT_CACHE_PATH", "content_cache.sqlite3"),
+            ("JOBS_DB_PATH", "jobs.sqlite3"),
+            ("JOBS_SPOOL_DIR", "job_files"),
+            ("LEXICAL_INDEX_DIR", "lexical"),
+            ("LOCAL_VECTOR_DIR", "vectors"),
+        ):
+            os.environ[key] = os.path.join(tmp, name)
+        os.environ["GEMINI_API_KEY"] = ""
+
+        print(
+            f"corpus: {args.docs} docs x {args.doc_kb} KB, store={args.store}, "
+            f"latency embed={args.embed_latency_ms:g}ms generate={args.generate_latency_ms:g}ms"
+        )
+        results = asyncio.run(run(args))
+        report(results)
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
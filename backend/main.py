@@ -1,9 +1,14 @@
+import asyncio
+import json
 import logging
-from typing import List, Dict, Any
+import os
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Path
+from fastapi import FastAPI, UploadFile, File, HTTPException, Path, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from starlette import status
 from dotenv import load_dotenv
@@ -11,12 +16,101 @@ from dotenv import load_dotenv
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-from services.gemini_client import GeminiClient
-from services.qdrant_client import upsert_chunk, search_chunks
-from services.opus_client import run_review_workflow
+from services.answer_cache import answer_cache
+from services.chunk_store import PARTIAL_CONTENT_HASH, get_chunk_store, make_chunk_id
+from services.content_cache import content_hash
+from services.gemini_client import EMBED_BATCH_SIZE, GeminiClient
+from services.vector_store import (
+    ChunkWriter,
+    adelete_chunks,
+    asearch_chunks,
+    asearch_chunks_batch,
+    aupdate_chunks,
+    get_vector_store,
+)
+from services.opus_client import arun_review_workflow
+from services.outbound import CircuitOpenError, DeadlineExceeded, aclose_http_clients, aiter_within, deadline_scope
+from services.jobs import JobProgress, JobQueue
+from services.media import MediaPipeline
+from services import metrics
+from services.metrics import MetricsMiddleware, stage
+from services.lexical_index import aindex_chunks, aremove_chunks, asearch_lexical, reciprocal_rank_fusion
+from services.rate_limiter import RateLimiter
+from services.reranker import RERANK_CANDIDATES, RERANK_ENABLED, rerank, select_chunks
+
+# How many files are extracted at once, and the Gemini request budget for extraction
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "4"))
+EXTRACT_REQUESTS_PER_MINUTE = float(os.getenv("EXTRACT_REQUESTS_PER_MINUTE", "0"))
+
+# "hybrid" fuses BM25 and dense results; "dense" uses Qdrant only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# Overall budget for one ask request; retries stop once it is spent
+ASK_DEADLINE_SECONDS = float(os.getenv("ASK_DEADLINE_SECONDS", "60"))
+
+# Batch ask: largest accepted batch and how many answers are generated at once
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "500"))
+ASK_BATCH_CONCURRENCY = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
+
+# How often warm-up re-checks a dependency that was not ready yet
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    metrics.setup_opentelemetry()
+    await job_queue.start()
+    # Warm up in the background so the app boots (and /health answers) even
+    # while a dependency is unreachable; /ready reports when it is done
+    warm_up = asyncio.create_task(_warm_up())
+    try:
+        yield
+    finally:
+        warm_up.cancel()
+        await asyncio.gather(warm_up, return_exceptions=True)
+        await job_queue.stop()
+        await gemini_client.aclose()
+        await get_vector_store().aclose()
+        await aclose_http_clients()
+        metrics.shutdown_opentelemetry()
+
+
+# Dependency name -> "ok", "pending" or the last error
+readiness: Dict[str, str] = {"gemini": "pending", "vector_store": "pending"}
+
+
+async def _warm_up() -> None:
+    """
+    Build the Gemini client (deferring the genai import to here), open the
+    vector store connection and verify the collection, retrying whatever
+    is not ready every WARMUP_RETRY_SECONDS.
+    """
+    async def vector_store() -> None:
+        store = await asyncio.to_thread(get_vector_store)
+        await store.awarm_up()
+
+    checks = {
+        "gemini": lambda: asyncio.to_thread(gemini_client.warm_up),
+        "vector_store": vector_store,
+    }
+    while True:
+        for name, check in checks.items():
+            if readiness[name] == "ok":
+                continue
+            with stage(f"warm_up_{name}"):
+                try:
+                    await check()
+                except Exception as exc:
+                    readiness[name] = f"{type(exc).__name__}: {exc}"
+                    continue
+            readiness[name] = "ok"
+        if all(state == "ok" for state in readiness.values()):
+            return
+        await asyncio.sleep(WARMUP_RETRY_SECONDS)
 
 
-app = FastAPI(title="AutoRAG OS Backend", version="1.0.0")
+app = FastAPI(title="AutoRAG OS Backend", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,13 +119,19 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 
 class AskRequest(BaseModel):
     question: str
 
 
-gemini_client = GeminiClient()
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+
+
+gemini_client = GeminiClient(extract_rate_limiter=RateLimiter(EXTRACT_REQUESTS_PER_MINUTE))
+media_pipeline = MediaPipeline(gemini_client)
 
 
 @app.get("/health")
@@ -39,69 +139,244 @@ async def health_check() -> JSONResponse:
     return JSONResponse(content={"status": "ok"}, status_code=status.HTTP_200_OK)
 
 
-async def _read_files(files: List[UploadFile]) -> List[Dict[str, Any]]:
-    file_objs: List[Dict[str, Any]] = []
-    for f in files:
-        data = await f.read()
-        file_objs.append(
-            {
-                "filename": f.filename,
-                "content_type": f.content_type,
-                "data": data,
-            }
-        )
-    return file_objs
+@app.get("/ready")
+async def readiness_check() -> JSONResponse:
+    """Liveness is /health; this returns 503 until every dependency has warmed up."""
+    ready = all(state == "ok" for state in readiness.values())
+    return JSONResponse(
+        content={"status": "ready" if ready else "not_ready", "checks": dict(readiness)},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    """Prometheus text exposition of stage, provider, cache and HTTP metrics."""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE)
+
+
+async def _load_file_data(file_obj: Dict[str, Any]) -> None:
+    file_obj["data"], file_obj["content_hash"] = await asyncio.to_thread(_read_path, file_obj["path"])
+
+
+def _read_path(path: str) -> Tuple[bytes, str]:
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, content_hash(data)
+
+
+async def _release_file_data(file_obj: Dict[str, Any]) -> None:
+    file_obj.pop("data", None)
 
 
 @app.post("/api/workspaces/{workspace_id}/upload")
 async def upload_workspace_data(
     workspace_id: str = Path(...),
     files: List[UploadFile] = File(...),
-) -> Dict[str, Any]:
+    wait: bool = Query(False),
+) -> JSONResponse:
+    """
+    Queue the uploaded files for ingestion and return the job id right away.
+    Progress is reported by GET /api/jobs/{job_id}; pass ?wait=true to block
+    until the job has finished instead.
+    """
     if not files:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="At least one file must be provided.",
         )
+    # Manifests and chunk ids are keyed by filename, so two files with the
+    # same name in one job would overwrite each other's chunks
+    duplicates = sorted(name for name, n in Counter(f.filename for f in files).items() if n > 1)
+    if duplicates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Duplicate filenames in upload: {', '.join(duplicates)}",
+        )
 
     try:
-        file_objs = await _read_files(files)
-        total_chunks = 0
-
-        for file_obj in file_objs:
-            text = await _extract_text_for_rag(file_obj)
-            if not text:
-                continue
-
-            chunks = gemini_client.chunk_text_for_rag(text)
-            for idx, chunk in enumerate(chunks):
-                chunk_text = (chunk.get("text") or "").strip()
-                if not chunk_text:
-                    continue
-
-                vector = gemini_client.embed_text(chunk_text)
-                if not vector:
-                    continue
-
-                payload = {
-                    "workspace_id": workspace_id,
-                    "filename": file_obj["filename"],
-                    "chunk_index": idx,
-                    "text": chunk_text,
-                }
-
-                upsert_chunk(workspace_id, vector, payload)
-                total_chunks += 1
-
-        return {"workspace_id": workspace_id, "chunks_indexed": total_chunks}
-
+        job_id = await job_queue.submit(workspace_id, files)
     except Exception as exc:
-        logger.exception("Failed to process workspace upload")
+        logger.exception("Failed to queue workspace upload")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(exc),
         ) from exc
 
+    if not wait:
+        return JSONResponse(
+            content={"workspace_id": workspace_id, "job_id": job_id, "status": "queued"},
+            status_code=status.HTTP_202_ACCEPTED,
+        )
+
+    job = await job_queue.wait(job_id)
+    if job["status"] == "failed":
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=job["error"],
+        )
+    return JSONResponse(
+        content={
+            "workspace_id": workspace_id,
+            "job_id": job_id,
+            "status": job["status"],
+            "chunks_indexed": job["chunks_indexed"],
+            "errors": job["errors"],
+        },
+        status_code=status.HTTP_200_OK,
+    )
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str = Path(...)) -> Dict[str, Any]:
+    job = job_queue.store.get_job(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found.",
+        )
+    return job
+
+
+async def _run_ingest_job(job: Dict[str, Any], progress: JobProgress) -> None:
+    """
+    Index a job's files incrementally. Each document has a manifest of its
+    chunk ids: an unchanged file is skipped before extraction, and for a
+    changed one only chunks whose id is new are embedded and upserted, while
+    chunks that disappeared are deleted once the new ones are written.
+    Chunk ids do not depend on position, so chunks that merely moved keep
+    their points and only get their chunk_index updated.
+    A file is only recorded as unchanged once every chunk has a vector; a
+    partially indexed one keeps the ids it got, so the next upload embeds
+    just the missing chunks.
+    """
+    workspace_id = job["workspace_id"]
+    file_objs = [dict(f) for f in job["files"]]
+    chunk_store = get_chunk_store()
+    manifests: List[Tuple[str, str, Dict[str, int]]] = []
+    stale_ids: List[str] = []
+    # Chunks buffered in the writer -> their file, so progress can be
+    # reported per batch as it lands rather than once per file
+    file_of_chunk: Dict[str, int] = {}
+
+    def on_flush(flushed_workspace: str, payloads: List[Dict[str, Any]]) -> None:
+        answer_cache.invalidate_workspace(flushed_workspace)
+        counts = Counter(file_of_chunk.pop(p["chunk_id"]) for p in payloads)
+        for idx, count in counts.items():
+            progress.chunks_indexed(idx, count)
+
+    async with ChunkWriter(workspace_id, on_flush=on_flush) as writer:
+        async for file_obj, text in _extract_concurrently(workspace_id, file_objs, progress):
+            if file_obj.get("error"):
+                progress.file_failed(file_obj["idx"], file_obj["error"])
+                continue
+            if file_obj.get("unchanged"):
+                progress.file_done(file_obj["idx"])
+                continue
+
+            filename = file_obj["filename"]
+            if not text.strip():
+                progress.file_failed(file_obj["idx"], "No text could be extracted.")
+                continue
+            with stage("chunk"):
+                # Chunking and hashing a large document takes long enough to
+                # stall concurrent requests, so it runs off the event loop
+                indexed_chunks = await asyncio.to_thread(_chunk_file, workspace_id, filename, text)
+
+            manifest = await asyncio.to_thread(chunk_store.get_manifest, workspace_id, filename)
+            known = manifest["chunks"] if manifest else {}
+            new_chunks = [c for c in indexed_chunks if c[2] not in known]
+            # Progress counts only the chunks this job embeds, so a file
+            # whose chunks are already indexed does not look stuck
+            progress.file_chunked(file_obj["idx"], len(new_chunks))
+            moved = [(idx, t, chunk_id) for idx, t, chunk_id in indexed_chunks if known.get(chunk_id, idx) != idx]
+            if moved:
+                await aupdate_chunks(workspace_id, {chunk_id: {"chunk_index": idx} for idx, _, chunk_id in moved})
+                await aindex_chunks(
+                    workspace_id,
+                    [
+                        {"filename": filename, "chunk_index": idx, "chunk_id": chunk_id, "text": t}
+                        for idx, t, chunk_id in moved
+                    ],
+                )
+                answer_cache.invalidate_workspace(workspace_id)
+            payloads = []
+            error = None
+            # Embed one batch at a time and hand it straight to the writer, so
+            # chunks show up as indexed while the rest of the file embeds
+            for start in range(0, len(new_chunks), EMBED_BATCH_SIZE):
+                batch = new_chunks[start:start + EMBED_BATCH_SIZE]
+                try:
+                    vectors = await gemini_client.aembed_texts([t for _, t, _ in batch])
+                except Exception as exc:
+                    # An embedding outage fails the file; what was written so
+                    # far is kept and the rest is embedded on the next upload
+                    logger.exception("Failed to embed %s", filename)
+                    error = str(exc) or type(exc).__name__
+                    break
+
+                for (idx, chunk_text, chunk_id), vector in zip(batch, vectors):
+                    if not vector:
+                        continue
+
+                    payload = {
+                        "workspace_id": workspace_id,
+                        "filename": filename,
+                        "chunk_index": idx,
+                        "chunk_id": chunk_id,
+                        "text": chunk_text,
+                    }
+
+                    file_of_chunk[chunk_id] = file_obj["idx"]
+                    await writer.aadd(vector, payload)
+                    payloads.append(payload)
+
+            await aindex_chunks(workspace_id, payloads)
+            current = {chunk_id: idx for idx, _, chunk_id in indexed_chunks if chunk_id in known}
+            current.update((p["chunk_id"], p["chunk_index"]) for p in payloads)
+            stale_ids.extend(set(known) - set(current))
+            missing = len(indexed_chunks) - len(current)
+            if missing:
+                manifests.append((filename, PARTIAL_CONTENT_HASH, current))
+                progress.file_failed(
+                    file_obj["idx"],
+                    error
+                    or f"{missing} of {len(indexed_chunks)} chunks could not be embedded; upload the file again to retry.",
+                )
+            else:
+                manifests.append((filename, file_obj["content_hash"], current))
+                progress.file_done(file_obj["idx"])
+
+    if stale_ids:
+        await adelete_chunks(workspace_id, stale_ids)
+        await aremove_chunks(workspace_id, stale_ids)
+        answer_cache.invalidate_workspace(workspace_id)
+    for filename, file_hash, chunks in manifests:
+        await asyncio.to_thread(chunk_store.put_manifest, workspace_id, filename, file_hash, chunks)
+
+
+def _chunk_file(workspace_id: str, filename: str, text: str) -> List[Tuple[int, str, str]]:
+    """(chunk_index, text, chunk_id) for every non-empty chunk of a document."""
+    indexed_chunks = [
+        (idx, (chunk.get("text") or "").strip())
+        for idx, chunk in enumerate(gemini_client.chunk_text_for_rag(text))
+    ]
+    seen: Counter = Counter()
+    result = []
+    for idx, t in indexed_chunks:
+        if t:
+            result.append((idx, t, make_chunk_id(workspace_id, filename, t, seen[t])))
+            seen[t] += 1
+    return result
+
+
+async def _is_unchanged(workspace_id: str, file_obj: Dict[str, Any]) -> bool:
+    manifest = await asyncio.to_thread(get_chunk_store().get_manifest, workspace_id, file_obj["filename"])
+    return manifest is not None and manifest["content_hash"] == file_obj["content_hash"]
+
+
+job_queue = JobQueue(_run_ingest_job)
+
 
 @app.post("/api/workspaces/{workspace_id}/ask")
 async def ask_workspace(
@@ -117,25 +392,9 @@ async def ask_workspace(
     question = body.question.strip()
 
     try:
-        q_vector = gemini_client.embed_text(question)
-        if not q_vector:
-            raise RuntimeError("Failed to embed question")
-
-        retrieved = search_chunks(workspace_id, q_vector, limit=5)
-
-        context_chunks: List[Dict[str, Any]] = []
-        for hit in retrieved:
-            context_chunks.append(
-                {
-                    "text": hit.get("text", ""),
-                    "source": hit.get("filename", ""),
-                    "chunk_index": hit.get("chunk_index", -1),
-                }
-            )
-
-        rag_result = gemini_client.answer_with_context(
-            question=question, context_chunks=context_chunks,
-        )
+        with deadline_scope(ASK_DEADLINE_SECONDS):
+            context_chunks, q_vector = await _retrieve_context(workspace_id, question)
+            rag_result = await _answer(workspace_id, question, context_chunks, q_vector)
 
         return {
             "workspace_id": workspace_id,
@@ -144,6 +403,16 @@ async def ask_workspace(
             "rag_result": rag_result,
         }
 
+    except (DeadlineExceeded, asyncio.TimeoutError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Timed out while answering the question.",
+        ) from exc
+    except CircuitOpenError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(exc),
+        ) from exc
     except Exception as exc:
         logger.exception("Failed to process ask request")
         raise HTTPException(
@@ -152,6 +421,308 @@ async def ask_workspace(
         ) from exc
 
 
+@app.post("/api/workspaces/{workspace_id}/ask/stream")
+async def ask_workspace_stream(
+    workspace_id: str = Path(...),
+    body: AskRequest = None,
+) -> StreamingResponse:
+    """
+    Server-Sent Events variant of /ask. Emits a "context" event with the
+    retrieved chunks, "token" events as the answer is generated, and a final
+    "result" event carrying the full rag_result (or an "error" event).
+    """
+    if body is None or not body.question.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Question is required.",
+        )
+
+    question = body.question.strip()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            # Retrieval and every streamed token count against one deadline
+            async for event in aiter_within(_stream_answer(workspace_id, question), ASK_DEADLINE_SECONDS):
+                yield event
+        except (DeadlineExceeded, asyncio.TimeoutError):
+            logger.warning("Timed out while streaming an answer for workspace %s", workspace_id)
+            yield _sse("error", {"detail": "Timed out while answering the question."})
+        except Exception as exc:
+            logger.exception("Failed to process streaming ask request")
+            yield _sse("error", {"detail": str(exc)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/api/workspaces/{workspace_id}/ask/batch")
+async def ask_workspace_batch(
+    workspace_id: str = Path(...),
+    body: AskBatchRequest = None,
+) -> Dict[str, Any]:
+    """
+    Answer many questions against one workspace. All uncached questions are
+    embedded in batched calls and searched with one batched vector query;
+    answers are then generated with at most ASK_BATCH_CONCURRENCY in flight.
+    Results come back in request order, each with either the usual
+    context_chunks/rag_result or an "error".
+    """
+    if body is None or not body.questions:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one question is required.",
+        )
+    if len(body.questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions are allowed per batch.",
+        )
+
+    questions = [q.strip() for q in body.questions]
+    results: List[Dict[str, Any]] = [{"question": q} for q in questions]
+    pending = [i for i, q in enumerate(questions) if q]
+    for i, q in enumerate(questions):
+        if not q:
+            results[i]["error"] = "Question is required."
+
+    try:
+        vectors = await _embed_questions([questions[i] for i in pending])
+    except Exception as exc:
+        logger.exception("Failed to embed batch questions")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(exc),
+        ) from exc
+    for i, vector in zip(pending, vectors):
+        if not vector:
+            results[i]["error"] = "Failed to embed question"
+    embedded = [(i, v) for i, v in zip(pending, vectors) if v]
+
+    limit, candidates = _retrieval_limits()
+    try:
+        dense_batches = await asearch_chunks_batch(workspace_id, [v for _, v in embedded], limit=candidates)
+    except Exception as exc:
+        logger.exception("Failed to search batch questions")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(exc),
+        ) from exc
+
+    semaphore = asyncio.Semaphore(max(1, ASK_BATCH_CONCURRENCY))
+
+    async def answer(i: int, q_vector: List[float], dense: List[Dict[str, Any]]) -> None:
+        question = questions[i]
+        async with semaphore:
+            try:
+                with deadline_scope(ASK_DEADLINE_SECONDS):
+                    context_chunks = await _build_context(workspace_id, question, dense, limit)
+                    rag_result = await _answer(workspace_id, question, context_chunks, q_vector)
+            except Exception as exc:
+                logger.exception("Failed to answer batch question %d", i)
+                results[i]["error"] = str(exc) or type(exc).__name__
+                return
+        results[i]["context_chunks"] = context_chunks
+        results[i]["rag_result"] = rag_result
+
+    await asyncio.gather(*(answer(i, v, dense) for (i, v), dense in zip(embedded, dense_batches)))
+    return {"workspace_id": workspace_id, "results": results}
+
+
+async def _embed_questions(questions: List[str]) -> List[List[float]]:
+    """Query vectors for many questions, embedding only the ones not cached."""
+    model = gemini_client.embed_model_name
+    vectors = [answer_cache.get_query_vector(model, q) for q in questions]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        embedded = await gemini_client.aembed_texts(
+            [questions[i] for i in missing], provider=gemini_client.provider
+        )
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+            answer_cache.set_query_vector(model, questions[i], vector)
+    return vectors
+
+
+async def _answer(
+    workspace_id: str, question: str, context_chunks: List[Dict[str, Any]], q_vector: List[float]
+) -> Dict[str, Any]:
+    """
+    Answer from the exact cache, then from a semantically close past
+    question, and only then by calling the model.
+    """
+    rag_result = _cached_answer(workspace_id, question, context_chunks, q_vector)
+    if rag_result is None:
+        rag_result = await gemini_client.aanswer_with_context(
+            question=question, context_chunks=context_chunks,
+        )
+        _cache_answer(workspace_id, question, context_chunks, q_vector, rag_result)
+    return rag_result
+
+
+async def _stream_answer(workspace_id: str, question: str) -> AsyncIterator[str]:
+    """SSE events for /ask/stream, with the same cache lookups as _answer."""
+    context_chunks, q_vector = await _retrieve_context(workspace_id, question)
+    yield _sse("context", {"context_chunks": context_chunks})
+
+    rag_result = _cached_answer(workspace_id, question, context_chunks, q_vector)
+    if rag_result is not None:
+        yield _sse("token", {"text": rag_result.get("answer", "")})
+        yield _sse("result", rag_result)
+        return
+
+    async for event in gemini_client.astream_answer_with_context(
+        question=question, context_chunks=context_chunks,
+    ):
+        if event["type"] == "token":
+            yield _sse("token", {"text": event["text"]})
+        else:
+            rag_result = event["rag_result"]
+            _cache_answer(workspace_id, question, context_chunks, q_vector, rag_result)
+            yield _sse("result", rag_result)
+
+
+def _cached_answer(
+    workspace_id: str, question: str, context_chunks: List[Dict[str, Any]], q_vector: List[float]
+) -> Optional[Dict[str, Any]]:
+    rag_result = answer_cache.get_answer(workspace_id, question, _context_ids(context_chunks))
+    if rag_result is None:
+        rag_result = answer_cache.get_similar_answer(workspace_id, q_vector)
+    return rag_result
+
+
+def _cache_answer(
+    workspace_id: str,
+    question: str,
+    context_chunks: List[Dict[str, Any]],
+    q_vector: List[float],
+    rag_result: Dict[str, Any],
+) -> None:
+    if "error" in rag_result:
+        return
+    answer_cache.set_answer(workspace_id, question, _context_ids(context_chunks), rag_result)
+    answer_cache.set_similar_answer(workspace_id, q_vector, rag_result)
+
+
+def _context_ids(context_chunks: List[Dict[str, Any]]) -> List[Tuple[str, int]]:
+    return [(c["source"], c["chunk_index"]) for c in context_chunks]
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _retrieval_limits() -> Tuple[int, int]:
+    """(chunks kept after fusion, dense candidates fetched per question)."""
+    # With reranking on, over-fetch and let the reranker pick k adaptively
+    limit = RERANK_CANDIDATES if RERANK_ENABLED else 5
+    if RETRIEVAL_MODE == "hybrid":
+        return limit, max(HYBRID_CANDIDATES, limit)
+    return limit, limit
+
+
+async def _retrieve_context(workspace_id: str, question: str) -> Tuple[List[Dict[str, Any]], List[float]]:
+    q_vector = answer_cache.get_query_vector(gemini_client.embed_model_name, question)
+    if q_vector is None:
+        q_vector = await gemini_client.aembed_text(question)
+        answer_cache.set_query_vector(gemini_client.embed_model_name, question, q_vector)
+    if not q_vector:
+        raise RuntimeError("Failed to embed question")
+
+    limit, candidates = _retrieval_limits()
+    dense = await asearch_chunks(workspace_id, q_vector, limit=candidates)
+    return await _build_context(workspace_id, question, dense, limit), q_vector
+
+
+async def _build_context(
+    workspace_id: str, question: str, dense: List[Dict[str, Any]], limit: int
+) -> List[Dict[str, Any]]:
+    """Fuse dense hits with BM25 (in hybrid mode), rerank, and shape them for the answer model."""
+    if RETRIEVAL_MODE == "hybrid":
+        _, candidates = _retrieval_limits()
+        lexical = await asearch_lexical(workspace_id, question, limit=candidates)
+        with stage("fusion"):
+            retrieved = reciprocal_rank_fusion(
+                [
+                    [(_chunk_key(hit), hit) for hit in dense],
+                    [(_chunk_key(hit), hit) for _, hit in lexical],
+                ],
+                limit=limit,
+            )
+    else:
+        retrieved = dense[:limit]
+
+    if RERANK_ENABLED:
+        retrieved = rerank(question, retrieved)
+        with stage("select"):
+            retrieved = select_chunks(retrieved)
+
+    context_chunks: List[Dict[str, Any]] = []
+    for hit in retrieved:
+        context_chunks.append(
+            {
+                "text": hit.get("text", ""),
+                "source": hit.get("filename", ""),
+                "chunk_index": hit.get("chunk_index", -1),
+                "score": hit.get("rerank_score", hit.get("score")),
+            }
+        )
+    return context_chunks
+
+
+def _chunk_key(hit: Dict[str, Any]) -> Tuple[str, int]:
+    return hit.get("filename", ""), hit.get("chunk_index", -1)
+
+
 async def _extract_text_for_rag(file_obj: Dict[str, Any]) -> str:
-    text = gemini_client.extract_text_from_file(file_obj)
+    # Images, scans and audio go through segmented AIML OCR/transcription
+    # when it is configured; everything else (and anything it cannot split)
+    # takes the usual local-extractor/Gemini path
+    text = await media_pipeline.aextract_text(file_obj)
+    if text is None:
+        text = await gemini_client.aextract_text_from_file(file_obj)
     return text or ""
+
+
+async def _extract_concurrently(
+    workspace_id: str,
+    file_objs: List[Dict[str, Any]],
+    progress: JobProgress,
+) -> AsyncIterator[Tuple[Dict[str, Any], str]]:
+    """
+    Extract files in parallel (bounded by EXTRACT_CONCURRENCY and the request
+    budget) and yield (file_obj, text) in upload order, so the caller can
+    chunk and embed file N while later files are still being extracted.
+    At most EXTRACT_CONCURRENCY uploads are held in memory at once; with a
+    concurrency of 1 files are streamed through strictly one at a time.
+    A file that fails to extract is yielded with its "error" set, and one
+    whose content is already indexed is yielded with "unchanged" set.
+    """
+    semaphore = asyncio.Semaphore(max(1, EXTRACT_CONCURRENCY))
+
+    async def extract(file_obj: Dict[str, Any]) -> str:
+        async with semaphore:
+            progress.file_started(file_obj["idx"])
+            try:
+                await _load_file_data(file_obj)
+                if await _is_unchanged(workspace_id, file_obj):
+                    file_obj["unchanged"] = True
+                    return ""
+                return await _extract_text_for_rag(file_obj)
+            except Exception as exc:
+                logger.exception("Failed to extract %s", file_obj.get("filename"))
+                file_obj["error"] = str(exc)
+                return ""
+            finally:
+                await _release_file_data(file_obj)
+
+    tasks = [asyncio.create_task(extract(file_obj)) for file_obj in file_objs]
+    try:
+        for file_obj, task in zip(file_objs, tasks):
+            yield file_obj, await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,7 +1,7 @@
 import os
 from typing import Optional
 
-import requests
+from services.outbound import get_async_http_client, get_provider, record_response_bytes
 
 AIML_API_KEY = os.getenv("AIML_API_KEY", "")
 AIML_BASE_URL = os.getenv("AIML_BASE_URL", "https://api.aimlapi.com")
@@ -11,36 +11,50 @@ class AimlClient:
     def __init__(self):
         self.api_key = AIML_API_KEY
         self.base_url = AIML_BASE_URL
+        self.provider = get_provider("aiml")
 
     def _headers(self):
         return {
             "Authorization": f"Bearer {self.api_key}",
         }
 
-    def ocr_image_to_text(self, image_bytes: bytes) -> Optional[str]:
-        if not self.api_key:
+    async def _apost_file(self, path: str, files, timeout: float) -> Optional[dict]:
+        async def post(attempt_timeout: float):
+            resp = await get_async_http_client().post(
+                f"{self.base_url}{path}",
+                headers=self._headers(),
+                files=files,
+                timeout=attempt_timeout,
+            )
+            record_response_bytes("aiml", resp)
+            resp.raise_for_status()
+            return resp.json()
+
+        try:
+            return await self.provider.call(post, timeout=timeout)
+        except Exception:
             return None
 
-        url = f"{self.base_url}/v1/ocr"
-        files = {"file": ("image.png", image_bytes, "image/png")}
-        resp = requests.post(url, headers=self._headers(), files=files, timeout=60)
-
-        if resp.status_code != 200:
+    async def aocr_image_to_text(
+        self, image_bytes: bytes, filename: str = "image.png", content_type: str = "image/png"
+    ) -> Optional[str]:
+        if not self.api_key:
             return None
 
-        data = resp.json()
+        files = {"file": (filename, image_bytes, content_type)}
+        data = await self._apost_file("/v1/ocr", files, timeout=60)
+        if data is None:
+            return None
         return data.get("text") or data.get("result") or None
 
-    def audio_to_text(self, audio_bytes: bytes) -> Optional[str]:
+    async def aaudio_to_text(
+        self, audio_bytes: bytes, filename: str = "audio.wav", content_type: str = "audio/wav"
+    ) -> Optional[str]:
         if not self.api_key:
             return None
 
-        url = f"{self.base_url}/v1/transcribe"
-        files = {"file": ("audio.wav", audio_bytes, "audio/wav")}
-        resp = requests.post(url, headers=self._headers(), files=files, timeout=120)
-
-        if resp.status_code != 200:
+        files = {"file": (filename, audio_bytes, content_type)}
+        data = await self._apost_file("/v1/transcribe", files, timeout=120)
+        if data is None:
             return None
-
-        data = resp.json()
         return data.get("text") or data.get("transcript") or None
@@ -0,0 +1,184 @@
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import LRUCache, TTLCache
+
+from services.metrics import CACHE_EVICTIONS, record_cache
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "900"))
+
+# Semantic level: reuse the answer of a past question whose vector is within
+# SEMANTIC_CACHE_THRESHOLD cosine similarity. Keep the threshold high; a
+# paraphrase match returns another question's answer verbatim.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") not in ("0", "false", "False")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))  # entries per workspace
+SEMANTIC_CACHE_WORKSPACES = int(os.getenv("SEMANTIC_CACHE_WORKSPACES", "64"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(ANSWER_CACHE_TTL)))
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class SemanticIndex:
+    """
+    Fixed-capacity nearest-neighbour index over one workspace's recent
+    question vectors. Lookup is one matrix-vector product over at most
+    ``capacity`` rows; when full, the least recently used entry is replaced.
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = max(1, capacity)
+        self.vectors = np.zeros((self.capacity, dim), dtype=np.float32)
+        self.results: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self.expires = np.zeros(self.capacity)  # 0 marks an empty slot
+        self.used = np.zeros(self.capacity)
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return int((self.expires > time.monotonic()).sum())
+
+    def lookup(self, vector: np.ndarray, threshold: float) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        scores = self.vectors @ vector
+        scores[self.expires <= now] = -np.inf
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        self.used[best] = now
+        return self.results[best]
+
+    def add(self, vector: np.ndarray, result: Dict[str, Any], ttl: float) -> None:
+        now = time.monotonic()
+        free = np.flatnonzero(self.expires <= now)
+        if free.size:
+            slot = int(free[0])
+        else:
+            slot = int(np.argmin(self.used))
+            self.evictions += 1
+            CACHE_EVICTIONS.inc("semantic")
+        self.vectors[slot] = vector
+        self.results[slot] = result
+        self.expires[slot] = now + ttl
+        self.used[slot] = now
+
+
+class AnswerCache:
+    """
+    Three-level in-memory cache for /ask: question text -> query vector,
+    (workspace, normalized question, retrieved chunk ids) -> rag_result, and
+    a per-workspace semantic index that matches paraphrased questions by
+    query vector. Answers are tied to the workspace's index generation, so
+    indexing new chunks into a workspace invalidates its cached answers.
+    """
+
+    def __init__(
+        self,
+        query_size: int = QUERY_CACHE_SIZE,
+        query_ttl: float = QUERY_CACHE_TTL,
+        answer_size: int = ANSWER_CACHE_SIZE,
+        answer_ttl: float = ANSWER_CACHE_TTL,
+        semantic_enabled: bool = SEMANTIC_CACHE_ENABLED,
+        semantic_threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        semantic_size: int = SEMANTIC_CACHE_SIZE,
+        semantic_ttl: float = SEMANTIC_CACHE_TTL,
+    ):
+        self._vectors: TTLCache = TTLCache(maxsize=query_size, ttl=query_ttl)
+        self._answers: TTLCache = TTLCache(maxsize=answer_size, ttl=answer_ttl)
+        self._generations: Dict[str, int] = {}
+        self.semantic_enabled = semantic_enabled
+        self.semantic_threshold = semantic_threshold
+        self.semantic_size = semantic_size
+        self.semantic_ttl = semantic_ttl
+        self._semantic: LRUCache = LRUCache(maxsize=SEMANTIC_CACHE_WORKSPACES)
+        self._semantic_evictions = 0
+        self.hits = {"query": 0, "answer": 0, "semantic": 0}
+        self.misses = {"query": 0, "answer": 0, "semantic": 0}
+
+    def get_query_vector(self, model: str, question: str) -> Optional[List[float]]:
+        vector = self._vectors.get((model, question))
+        self._count("query", vector is not None)
+        return vector
+
+    def set_query_vector(self, model: str, question: str, vector: List[float]) -> None:
+        if vector:
+            self._vectors[(model, question)] = vector
+
+    def get_answer(self, workspace_id: str, question: str, chunk_ids: Sequence[Any]) -> Optional[Dict[str, Any]]:
+        result = self._answers.get(self._answer_key(workspace_id, question, chunk_ids))
+        self._count("answer", result is not None)
+        return dict(result) if result is not None else None
+
+    def set_answer(
+        self, workspace_id: str, question: str, chunk_ids: Sequence[Any], rag_result: Dict[str, Any]
+    ) -> None:
+        self._answers[self._answer_key(workspace_id, question, chunk_ids)] = dict(rag_result)
+
+    def get_similar_answer(self, workspace_id: str, vector: Sequence[float]) -> Optional[Dict[str, Any]]:
+        """Cached answer of a past question within the cosine threshold, if any."""
+        if not self.semantic_enabled or not vector:
+            return None
+        index = self._semantic.get(workspace_id)
+        result = index.lookup(_unit(vector), self.semantic_threshold) if index is not None else None
+        self._count("semantic", result is not None)
+        return dict(result) if result is not None else None
+
+    def set_similar_answer(self, workspace_id: str, vector: Sequence[float], rag_result: Dict[str, Any]) -> None:
+        if not self.semantic_enabled or not vector:
+            return
+        index = self._semantic.get(workspace_id)
+        if index is None or index.vectors.shape[1] != len(vector):
+            index = SemanticIndex(self.semantic_size, len(vector))
+            self._semantic[workspace_id] = index
+        index.add(_unit(vector), dict(rag_result), self.semantic_ttl)
+
+    def invalidate_workspace(self, workspace_id: str) -> None:
+        # Old entries can no longer be addressed and age out of the LRU
+        self._generations[workspace_id] = self._generations.get(workspace_id, 0) + 1
+        index = self._semantic.pop(workspace_id, None)
+        if index is not None:
+            self._semantic_evictions += index.evictions
+
+    def stats(self) -> Dict[str, Any]:
+        indexes = list(self._semantic.values())
+        return {
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "query_entries": len(self._vectors),
+            "answer_entries": len(self._answers),
+            "semantic_workspaces": len(indexes),
+            "semantic_entries": sum(len(index) for index in indexes),
+            "semantic_evictions": self._semantic_evictions + sum(index.evictions for index in indexes),
+        }
+
+    def _answer_key(self, workspace_id: str, question: str, chunk_ids: Sequence[Any]) -> Tuple:
+        return (
+            workspace_id,
+            self._generations.get(workspace_id, 0),
+            normalize_question(question),
+            tuple(chunk_ids),
+        )
+
+    def _count(self, level: str, hit: bool) -> None:
+        record_cache(level, hit)
+        if hit:
+            self.hits[level] += 1
+        else:
+            self.misses[level] += 1
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import NAMESPACE_URL, uuid5
+
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", ".cache/chunks.sqlite3")
+
+_CHUNK_NAMESPACE = uuid5(NAMESPACE_URL, "autoragos/chunk")
+
+# Stored instead of the content hash when some of a document's chunks could
+# not be indexed, so the next upload of the same bytes is not skipped
+PARTIAL_CONTENT_HASH = "partial"
+
+
+def make_chunk_id(workspace_id: str, filename: str, text: str, occurrence: int = 0) -> str:
+    """
+    Deterministic UUID for a chunk, usable as the vector store point id.
+    It depends on the text and on how many identical chunks come before it
+    in the document, not on its position, so inserting a paragraph only
+    changes the ids of the chunks it touches.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid5(_CHUNK_NAMESPACE, f"{workspace_id}\0{filename}\0{text_hash}\0{occurrence}"))
+
+
+class ChunkStore:
+    """
+    Local SQLite store for chunk texts keyed by chunk id, so the vector store
+    only has to carry ids and filter fields. It also keeps a manifest per
+    document (content hash and the chunk_index of each indexed chunk id) for
+    incremental re-indexing; a partially indexed document has
+    PARTIAL_CONTENT_HASH.
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " chunk_id TEXT PRIMARY KEY, workspace_id TEXT NOT NULL, text TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " workspace_id TEXT NOT NULL, filename TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL, chunk_ids TEXT NOT NULL,"
+            " PRIMARY KEY (workspace_id, filename))"
+        )
+
+    def put_many(self, workspace_id: str, chunks: Iterable[Tuple[str, str]]) -> None:
+        rows = [(chunk_id, workspace_id, text) for chunk_id, text in chunks]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, workspace_id, text) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.execute("COMMIT")
+
+    def get_many(self, chunk_ids: List[str]) -> Dict[str, str]:
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT chunk_id, text FROM chunks WHERE chunk_id IN ({placeholders})",
+                chunk_ids,
+            ).fetchall()
+        return dict(rows)
+
+    def delete_many(self, chunk_ids: List[str]) -> None:
+        if not chunk_ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(c,) for c in chunk_ids])
+
+    def get_manifest(self, workspace_id: str, filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, chunk_ids FROM documents WHERE workspace_id = ? AND filename = ?",
+                (workspace_id, filename),
+            ).fetchone()
+        if row is None:
+            return None
+        chunks = json.loads(row[1])
+        if isinstance(chunks, list):
+            # Manifests written before chunk indexes were kept
+            chunks = {chunk_id: -1 for chunk_id in chunks}
+        return {"content_hash": row[0], "chunks": chunks}
+
+    def put_manifest(self, workspace_id: str, filename: str, content_hash: str, chunks: Dict[str, int]) -> None:
+        """Record a document's content hash and its indexed chunk ids mapped to their chunk_index."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (workspace_id, filename, content_hash, chunk_ids)"
+                " VALUES (?, ?, ?, ?)",
+                (workspace_id, filename, content_hash, json.dumps(chunks)),
+            )
+
+
+_store = None
+
+
+def get_chunk_store() -> ChunkStore:
+    global _store
+    if _store is None:
+        _store = ChunkStore()
+    return _store
@@ -0,0 +1,131 @@
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Union
+
+# text-embedding-004 accepts at most 2048 input tokens
+EMBED_MODEL_MAX_TOKENS = 2048
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+# A stream without blank lines is cut at a line break once this much is buffered
+_MAX_PARAGRAPH_BUFFER = 64 * 1024
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n")
+
+# Progressively finer split points for text that is too large: lines,
+# sentences, then words. Each comes with the separator used to rejoin pieces.
+_SPLITTERS = [
+    (re.compile(r"\n"), "\n"),
+    (re.compile(r"(?<=[.!?;:])\s+"), " "),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cheap local estimate of embedding-model tokens: one per word or
+    punctuation mark, and never less than one per four characters.
+    """
+    return max(len(_TOKEN_RE.findall(text)), (len(text) + 3) // 4)
+
+
+class _Unit(NamedTuple):
+    text: str
+    sep: str
+    tokens: int
+
+
+def iter_chunks(
+    text: Union[str, Iterable[str]],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[str]:
+    """
+    Split text (a string or an iterable of string pieces) into chunks of at
+    most ``max_tokens``, consecutive chunks sharing up to ``overlap_tokens``
+    of trailing context. Paragraphs are kept whole where they fit; larger
+    ones are split by line, then sentence, then word.
+    """
+    max_tokens = max(1, min(max_tokens, EMBED_MODEL_MAX_TOKENS))
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    stream = [text] if isinstance(text, str) else text
+
+    def units() -> Iterator[_Unit]:
+        for paragraph in _paragraphs(stream):
+            yield from _split(paragraph, "\n\n", max_tokens, 0)
+
+    yield from _pack(units(), max_tokens, overlap_tokens)
+
+
+def _paragraphs(stream: Iterable[str]) -> Iterator[str]:
+    buf = ""
+    for piece in stream:
+        buf += piece
+        parts = _PARAGRAPH_BREAK_RE.split(buf)
+        buf = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.strip()
+        if len(buf) > _MAX_PARAGRAPH_BUFFER:
+            cut = buf.rfind("\n") + 1 or len(buf)
+            if buf[:cut].strip():
+                yield buf[:cut].strip()
+            buf = buf[cut:]
+    if buf.strip():
+        yield buf.strip()
+
+
+def _split(text: str, sep: str, max_tokens: int, level: int) -> Iterator[_Unit]:
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        yield _Unit(text, sep, tokens)
+        return
+
+    if level == len(_SPLITTERS):
+        # A single oversized "word" (URLs, base64, ...): cut by characters
+        step = max(1, len(text) * max_tokens // tokens)
+        for start in range(0, len(text), step):
+            piece = text[start:start + step]
+            yield _Unit(piece, sep if start == 0 else "", count_tokens(piece))
+        return
+
+    regex, joiner = _SPLITTERS[level]
+    parts = [p.strip() for p in regex.split(text) if p.strip()]
+    if len(parts) <= 1:
+        yield from _split(text, sep, max_tokens, level + 1)
+        return
+    for i, part in enumerate(parts):
+        yield from _split(part, sep if i == 0 else joiner, max_tokens, level + 1)
+
+
+def _pack(units: Iterable[_Unit], max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    current: List[_Unit] = []
+    total = 0
+    fresh = 0  # units in `current` not already emitted as overlap
+
+    for unit in units:
+        # Budget one token for the separator the unit is joined with
+        unit = unit._replace(tokens=unit.tokens + 1)
+        if current and total + unit.tokens > max_tokens:
+            yield _join(current)
+            tail: List[_Unit] = []
+            tail_tokens = 0
+            for prev in reversed(current):
+                if tail_tokens + prev.tokens > overlap_tokens:
+                    break
+                tail.insert(0, prev)
+                tail_tokens += prev.tokens
+            current, total, fresh = tail, tail_tokens, 0
+            while current and total + unit.tokens > max_tokens:
+                total -= current.pop(0).tokens
+        current.append(unit)
+        total += unit.tokens
+        fresh += 1
+
+    if current and fresh:
+        yield _join(current)
+
+
+def _join(units: List[_Unit]) -> str:
+    return units[0].text + "".join(u.sep + u.text for u in units[1:])
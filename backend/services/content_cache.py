@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+from services.metrics import record_cache
+
+CONTENT_CACHE_ENABLED = os.getenv("CONTENT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+CONTENT_CACHE_PATH = os.getenv("CONTENT_CACHE_PATH", ".cache/content_cache.sqlite3")
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+async def afile_hash(file_obj: Dict[str, Any]) -> str:
+    """The upload's content hash, reusing the one computed when it was read."""
+    digest = file_obj.get("content_hash")
+    if digest is None:
+        digest = file_obj["content_hash"] = await asyncio.to_thread(content_hash, file_obj["data"])
+    return digest
+
+
+class ContentCache:
+    """
+    Persistent SQLite cache for extracted text and embedding vectors, keyed
+    by content hash. Entries are evicted least-recently-used once the stored
+    values exceed ``max_bytes``. Every call hits SQLite, so async callers run
+    them in a worker thread.
+    """
+
+    def __init__(self, path: str = CONTENT_CACHE_PATH, max_bytes: int = CONTENT_CACHE_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            # Keys look like "text:<model>:<hash>" or "embed:<model>:<hash>"
+            record_cache("content_" + key.split(":", 1)[0], row is not None)
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def _set(self, key: str, value: bytes) -> None:
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time()),
+            )
+            self._total_bytes += len(value) - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Drop least-recently-used entries until we are back under 90% of the limit
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            doomed.append((key,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def get_text(self, digest: str, model: str) -> Optional[str]:
+        value = self._get(f"text:{model}:{digest}")
+        return value.decode("utf-8") if value is not None else None
+
+    def set_text(self, digest: str, model: str, text: str) -> None:
+        self._set(f"text:{model}:{digest}", text.encode("utf-8"))
+
+    def get_vector(self, text: str, model: str) -> Optional[List[float]]:
+        value = self._get(f"embed:{model}:{content_hash(text.encode('utf-8'))}")
+        if value is None:
+            return None
+        return array("f", value).tolist()
+
+    def set_vector(self, text: str, model: str, vector: List[float]) -> None:
+        self._set(f"embed:{model}:{content_hash(text.encode('utf-8'))}", array("f", vector).tobytes())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": entries,
+                "bytes": self._total_bytes,
+            }
+
+
+def default_cache() -> Optional[ContentCache]:
+    if not CONTENT_CACHE_ENABLED:
+        return None
+    return ContentCache()
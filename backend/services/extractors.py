@@ -0,0 +1,102 @@
+import io
+import mimetypes
+import os
+from importlib.util import find_spec
+from typing import Callable, Dict, Optional
+
+from services.metrics import stage
+
+# python-pptx and pypdf are slow to import, so only check that they are
+# installed here and import them on first use
+PPTX_AVAILABLE = find_spec("pptx") is not None
+PDF_AVAILABLE = find_spec("pypdf") is not None
+
+PPTX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+# A PDF whose text layer averages fewer characters per page is treated as a scan
+PDF_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_MIN_CHARS_PER_PAGE", "40"))
+
+# An extractor returns the plain text of a file, or None when it cannot handle
+# the content locally and the caller should fall back to the model.
+Extractor = Callable[[bytes], Optional[str]]
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register_extractor(*mime_types: str) -> Callable[[Extractor], Extractor]:
+    def decorator(func: Extractor) -> Extractor:
+        for mime_type in mime_types:
+            EXTRACTORS[mime_type] = func
+        return func
+
+    return decorator
+
+
+def resolve_mime_type(content_type: Optional[str], filename: Optional[str] = None) -> str:
+    """
+    Browsers often send a generic content type for .md/.csv/.json uploads;
+    guess from the filename in that case.
+    """
+    mime_type = (content_type or "").split(";")[0].strip().lower()
+    if mime_type and mime_type != "application/octet-stream":
+        return mime_type
+    if filename:
+        guessed, _ = mimetypes.guess_type(filename)
+        if guessed:
+            return guessed
+        if filename.lower().endswith((".md", ".markdown")):
+            return "text/markdown"
+    return mime_type or "application/octet-stream"
+
+
+def extract_locally(content_type: Optional[str], data: bytes, filename: Optional[str] = None) -> Optional[str]:
+    extractor = EXTRACTORS.get(resolve_mime_type(content_type, filename))
+    if extractor is None:
+        return None
+    with stage("extract_local"):
+        return extractor(data)
+
+
+@register_extractor(
+    "text/plain",
+    "text/markdown",
+    "text/x-markdown",
+    "text/csv",
+    "text/tab-separated-values",
+    "application/json",
+)
+def _plain_text(data: bytes) -> Optional[str]:
+    return data.decode("utf-8", errors="replace").strip()
+
+
+@register_extractor(PPTX_MIME_TYPE)
+def _pptx_text(data: bytes) -> Optional[str]:
+    if not PPTX_AVAILABLE:
+        return None
+    from pptx import Presentation
+
+    prs = Presentation(io.BytesIO(data))
+    text = []
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                text.append(shape.text)
+    return "\n".join(text).strip()
+
+
+@register_extractor("application/pdf")
+def _pdf_text(data: bytes) -> Optional[str]:
+    if not PDF_AVAILABLE:
+        return None
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        pages = [page.extract_text() or "" for page in reader.pages]
+    except Exception:
+        return None
+    text = "\n".join(p.strip() for p in pages if p.strip())
+    # No usable text layer: let the model OCR it
+    if not pages or len(text) < PDF_MIN_CHARS_PER_PAGE * len(pages):
+        return None
+    return text
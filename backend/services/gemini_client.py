@@ -1,144 +1,276 @@
-
+import asyncio
 import json
 import os
-from typing import List, Dict, Any
-
-from google import genai
-# Add pptx support
-try:
-    from pptx import Presentation
-except ImportError:
-    Presentation = None
+import threading
+import time
+from contextlib import aclosing
+from typing import List, Dict, Any, AsyncIterator, Optional
+
+from services.chunker import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, iter_chunks
+from services.content_cache import ContentCache, afile_hash, default_cache
+from services.extractors import PPTX_AVAILABLE, PPTX_MIME_TYPE, extract_locally
+from services.metrics import STAGE_SECONDS, record_bytes, record_tokens, stage
+from services.outbound import CircuitOpenError, Provider, get_provider, is_retryable
+from services.rate_limiter import RateLimiter
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# embed_content accepts at most 100 contents per request
+EMBED_BATCH_SIZE = int(os.getenv("GEMINI_EMBED_BATCH_SIZE", "100"))
+# Per-attempt timeout for extracting a whole file; large PDFs and videos take minutes
+EXTRACT_TIMEOUT = float(os.getenv("GEMINI_EXTRACT_TIMEOUT", "300"))
+
+ANSWER_SYSTEM_PROMPT = """
+You are an answer-generation agent for a Retrieval-Augmented Generation (RAG) system.
+
+You are given:
+- a user's question
+- a set of context chunks extracted from the user's private documents
+
+Rules:
+1. Use ONLY the provided context to answer. Do NOT use outside knowledge.
+2. If the answer is not clearly supported by the context, say:
+   "I cannot answer this based on the provided context."
+3. Be concise and factual.
+4. Provide a confidence score between 0.0 and 1.0 that reflects how well the context supports your answer, so if you are not sure with you answer or the question than just give me actual confidence score.
+5. Provide citations: a list of objects { "source": string, "chunk_index": number } corresponding to the chunks you used.
+6. if the confidence score is below 0.6, needs_human_review must be true.
+7. if needs_human_review is true, also provide followup_question: one natural-sounding question in plain language that would help the user clarify their original question so the next answer can be more accurate. Base it on the mismatch between the question and your answer, using the context only as needed for grounding. Otherwise use an empty string.
+
+Return ONLY valid JSON in this exact format:
+
+{
+  "answer": "<string>",
+  "confidence": <float between 0 and 1>,
+  "citations": [
+    { "source": "<string>", "chunk_index": <number> }
+  ],
+  "needs_human_review": <boolean>,
+  "followup_question": "<string>"
+}
+"""
+
+# Streamed answers come as plain text followed by a metadata trailer, so the
+# answer can be forwarded token by token without parsing partial JSON.
+STREAM_METADATA_MARKER = "###METADATA###"
+
+STREAM_ANSWER_SYSTEM_PROMPT = f"""
+You are an answer-generation agent for a Retrieval-Augmented Generation (RAG) system.
+
+You are given:
+- a user's question
+- a set of context chunks extracted from the user's private documents
+
+Rules:
+1. Use ONLY the provided context to answer. Do NOT use outside knowledge.
+2. If the answer is not clearly supported by the context, say:
+   "I cannot answer this based on the provided context."
+3. Be concise and factual.
+4. Provide a confidence score between 0.0 and 1.0 that reflects how well the context supports your answer.
+5. Provide citations: a list of objects {{ "source": string, "chunk_index": number }} corresponding to the chunks you used.
+6. If the confidence score is below 0.6, also provide followup_question: one natural-sounding question in plain language that would help the user clarify their original question so the next answer can be more accurate. Otherwise use an empty string.
+
+Output format:
+First write the answer as plain text (no JSON, no code fences).
+Then write a line containing exactly {STREAM_METADATA_MARKER}
+followed by ONLY valid JSON in this exact format:
+
+{{
+  "confidence": <float between 0 and 1>,
+  "citations": [
+    {{ "source": "<string>", "chunk_index": <number> }}
+  ],
+  "followup_question": "<string>"
+}}
+"""
+
+DEFAULT_FOLLOWUP_QUESTION = "Can you clarify or provide more details?"
 
 
 class GeminiClient:
-    def __init__(self):
-        self.client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
+    def __init__(self, cache: Optional[ContentCache] = None, extract_rate_limiter: Optional[RateLimiter] = None):
+        self._client: Any = None
+        self._client_lock = threading.Lock()
+        self.cache = cache if cache is not None else default_cache()
+        # Spaces out extraction requests to the model; local extraction and
+        # cache hits do not count against it
+        self.extract_rate_limiter = extract_rate_limiter or RateLimiter()
         print("GEMINI_API_KEY:", GEMINI_API_KEY)
         # You can change model names if needed
         self.text_model_name = "gemini-2.5-flash"
         self.embed_model_name = "text-embedding-004"
+        # genai keeps its own pooled HTTP client; calls still go through the
+        # shared retry/backoff and circuit-breaker policy. Ingestion has its
+        # own breaker and slots, so a run of slow uploads cannot fail /ask
+        self.provider = get_provider("gemini")
+        self.ingest_provider = get_provider("gemini_ingest")
+
+    @property
+    def client(self) -> Any:
+        """The genai.Client, created on first use; google.genai alone takes ~1s to import."""
+        if self._client is None and GEMINI_API_KEY:
+            with self._client_lock:
+                if self._client is None:
+                    from google import genai
+
+                    self._client = genai.Client(api_key=GEMINI_API_KEY)
+        return self._client
+
+    @client.setter
+    def client(self, value: Any) -> None:
+        self._client = value
+
+    def warm_up(self) -> None:
+        """Import genai and build the client ahead of the first request."""
+        if self.client is None:
+            raise RuntimeError("GEMINI_API_KEY not configured")
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        if client is None:
+            return
+        aio_close = getattr(getattr(client, "aio", None), "aclose", None)
+        if aio_close is not None:
+            await aio_close()
+        close = getattr(client, "close", None)
+        if close is not None:
+            close()
 
     def _ensure_client(self) -> bool:
         return self.client is not None
 
-    def extract_text_from_file(self, file_obj: Dict[str, Any]) -> str:
+    async def _agenerate(
+        self, contents: Any, provider: Optional[Provider] = None, timeout: Optional[float] = None
+    ) -> Any:
+        response = await (provider or self.provider).call(
+            lambda _timeout: self.client.aio.models.generate_content(model=self.text_model_name, contents=contents),
+            timeout=timeout,
+        )
+        _record_generation(contents, response)
+        return response
+
+    async def _aembed(self, texts: List[str], provider: Optional[Provider] = None) -> Any:
+        response = await (provider or self.provider).call(
+            lambda _timeout: self.client.aio.models.embed_content(model=self.embed_model_name, contents=texts)
+        )
+        record_bytes("gemini", sent=_payload_bytes(texts))
+        return response
+
+    async def aextract_text_from_file(self, file_obj: Dict[str, Any]) -> str:
         """
-        Use Gemini to turn an uploaded file (PDF, doc, image, etc.)
-        into plain text for RAG. If file is .pptx, extract text using python-pptx first, then send to Gemini.
+        Turn an uploaded file into plain text for RAG. Plain-text formats, .pptx
+        and PDFs with a text layer are handled locally by the extractor registry
+        in a worker thread; everything else (scans, images, video, ...) is sent
+        to Gemini.
         """
-        if not self._ensure_client():
-            return ""
-
         mime_type = file_obj.get("content_type") or "application/octet-stream"
         data = file_obj["data"]
 
-        # If PowerPoint, extract text using python-pptx, then send to Gemini
-        if mime_type == "application/vnd.openxmlformats-officedocument.presentationml.presentation":
-            if Presentation is None:
-                return "Error: python-pptx is not installed. Cannot process .pptx files."
-            import tempfile
-            with tempfile.NamedTemporaryFile(suffix=".pptx", delete=True) as tmp:
-                tmp.write(data)
-                tmp.flush()
-                prs = Presentation(tmp.name)
-                text = []
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            text.append(shape.text)
-                extracted_text = "\n".join(text)
-            # Now send extracted text to Gemini
-            prompt = (
-                "You are a document text extractor. "
-                "Read the following extracted text from a PowerPoint file and return ONLY the plain text content, "
-                "with no formatting, explanations, or extra commentary."
-            )
-            contents = [
-                {
-                    "role": "user",
-                    "parts": [
-                        {"text": extracted_text},
-                        {"text": prompt},
-                    ],
-                }
-            ]
-            response = self.client.models.generate_content(
-                model=self.text_model_name,
-                contents=contents,
-            )
-            return (getattr(response, "text", "") or "").strip()
-
-        # Otherwise, use Gemini for supported types
-        prompt = (
-            "You are a document text extractor. "
-            "Read the content of the attached file and return ONLY the plain text content, "
-            "with no formatting, explanations, or extra commentary."
-            "you can recive files can be image, pdf, docx, txt, video etc."
-        )
-
-        contents = [
-            {
-                "role": "user",
-                "parts": [
-                    {
-                        "inline_data": {
-                            "mime_type": mime_type,
-                            "data": data,
-                        }
-                    },
-                    {"text": prompt},
-                ],
-            }
-        ]
-
-        response = self.client.models.generate_content(
-            model=self.text_model_name,
-            contents=contents,
-        )
-
-        return (getattr(response, "text", "") or "").strip()
+        local_text = await asyncio.to_thread(extract_locally, mime_type, data, file_obj.get("filename"))
+        if local_text is not None:
+            return local_text
+        if mime_type == PPTX_MIME_TYPE and not PPTX_AVAILABLE:
+            return "Error: python-pptx is not installed. Cannot process .pptx files."
 
-    def chunk_text_for_rag(self, text: str, max_chars: int = 800) -> List[Dict[str, str]]:
-        chunks: List[Dict[str, str]] = []
-        current: List[str] = []
-        current_len = 0
+        if not self._ensure_client():
+            return ""
 
-        for paragraph in text.split("\n"):
-            p = paragraph.strip()
-            if not p:
-                continue
-            if current_len + len(p) + 1 > max_chars and current:
-                chunks.append({"text": "\n".join(current)})
-                current = [p]
-                current_len = len(p)
-            else:
-                current.append(p)
-                current_len += len(p) + 1
+        digest = await afile_hash(file_obj) if self.cache else None
+        if digest is not None:
+            cached = await asyncio.to_thread(self.cache.get_text, digest, self.text_model_name)
+            if cached is not None:
+                return cached
 
-        if current:
-            chunks.append({"text": "\n".join(current)})
+        contents = _file_extract_contents(mime_type, data)
 
-        return chunks
+        await self.extract_rate_limiter.acquire()
+        with stage("extract_model"):
+            response = await self._agenerate(contents, self.ingest_provider, timeout=EXTRACT_TIMEOUT)
+        text = _response_text(response)
+        if text and digest is not None:
+            await asyncio.to_thread(self.cache.set_text, digest, self.text_model_name, text)
+        return text
 
-    def embed_text(self, text: str) -> List[float]:
+    def chunk_text_for_rag(
+        self,
+        text: str,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    ) -> List[Dict[str, str]]:
+        return [{"text": chunk} for chunk in iter_chunks(text, max_tokens, overlap_tokens)]
+
+    def _cached_vectors(self, texts: List[str]) -> List[Optional[List[float]]]:
+        if not self.cache:
+            return [None] * len(texts)
+        return [self.cache.get_vector(t, self.embed_model_name) for t in texts]
+
+    def _store_vectors(self, texts: List[str], vectors: List[List[float]], indexes: List[int]) -> None:
+        if not self.cache:
+            return
+        for i in indexes:
+            if vectors[i]:
+                self.cache.set_vector(texts[i], self.embed_model_name, vectors[i])
+
+    async def aembed_text(self, text: str) -> List[float]:
         if not self._ensure_client():
             return []
 
-        resp = self.client.models.embed_content(
-            model=self.embed_model_name,
-            contents=[text],
-        )
-
-        # Adapt to common response shape: embeddings[0].values
+        with stage("embed_query"):
+            resp = await self._aembed([text])
         try:
             return list(resp.embeddings[0].values)
         except Exception:
             return []
 
-    def answer_with_context(
+    async def aembed_texts(
+        self, texts: List[str], batch_size: int = EMBED_BATCH_SIZE, provider: Optional[Provider] = None
+    ) -> List[List[float]]:
+        """
+        Embed many texts with as few embed_content calls as possible.
+        Returns one vector per input text, in order. A text the model rejects
+        gets an empty list instead of failing the whole batch, but an outage
+        (open circuit, retries exhausted) raises so the caller can fail the
+        document rather than silently drop its chunks. Vectors already in the
+        content cache are not re-embedded, and each finished batch is cached
+        right away so a retry after an outage only embeds what is missing.
+        Calls go through the ingest provider unless ``provider`` is given.
+        """
+        if not texts:
+            return []
+        if not self._ensure_client():
+            return [[] for _ in texts]
+
+        vectors = await asyncio.to_thread(self._cached_vectors, texts)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        batch_size = max(1, batch_size)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            with stage("embed_batch"):
+                embedded = await self._aembed_batch([texts[i] for i in batch], provider or self.ingest_provider)
+            for i, vector in zip(batch, embedded):
+                vectors[i] = vector
+            await asyncio.to_thread(self._store_vectors, texts, vectors, batch)
+        return vectors
+
+    async def _aembed_batch(self, texts: List[str], provider: Provider) -> List[List[float]]:
+        try:
+            resp = await self._aembed(texts, provider)
+            embeddings = resp.embeddings or []
+            if len(embeddings) != len(texts):
+                raise ValueError("embedding count does not match input count")
+            return [list(e.values or []) for e in embeddings]
+        except Exception as exc:
+            # Retries already happened in the provider; splitting a batch that
+            # failed for a transient reason would only multiply the load, and
+            # returning empty vectors would drop the chunks without a trace
+            if isinstance(exc, CircuitOpenError) or is_retryable(exc):
+                raise
+            if len(texts) == 1:
+                return [[]]
+            # Split the batch so a single bad text only loses its own vector
+            mid = len(texts) // 2
+            return await self._aembed_batch(texts[:mid], provider) + await self._aembed_batch(texts[mid:], provider)
+
+    async def aanswer_with_context(
         self,
         question: str,
         context_chunks: List[Dict[str, Any]],
@@ -146,8 +278,90 @@ class GeminiClient:
     ) -> Dict[str, Any]:
         """
         Use Gemini to answer a question using ONLY the provided context chunks.
-        Returns: { answer, confidence, citations, needs_human_review }
+        Returns: { answer, confidence, citations, needs_human_review }. The
+        follow-up question for low-confidence answers comes back in the same
+        response, so it never costs a second round-trip.
         """
+        early = self._answer_precheck(context_chunks)
+        if early is not None:
+            return early
+
+        with stage("answer"):
+            response = await self._agenerate(_answer_prompt(question, context_chunks))
+        return _parse_answer(_response_text(response), review_threshold)
+
+    async def astream_answer_with_context(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        review_threshold: float = 0.6,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream an answer as it is generated. Yields {"type": "token", "text"}
+        events for the answer text, then one {"type": "result", "rag_result"}
+        event with the same shape answer_with_context returns.
+        """
+        early = self._answer_precheck(context_chunks)
+        if early is not None:
+            if early["answer"]:
+                yield {"type": "token", "text": early["answer"]}
+            yield {"type": "result", "rag_result": early}
+            return
+
+        contents = _answer_prompt(question, context_chunks, STREAM_ANSWER_SYSTEM_PROMPT)
+        # Timed by hand: a stage() block must not stay open across yields
+        start = time.perf_counter()
+        first_token = True
+        usage = None
+        answer_parts: List[str] = []
+        pending = ""
+        metadata = None
+        # Only opening the stream is retried; once tokens have been forwarded
+        # a retry would duplicate them. The provider slot is held, and every
+        # read is timed out, until the stream is closed
+        stream = self.provider.stream(
+            lambda _timeout: self.client.aio.models.generate_content_stream(
+                model=self.text_model_name,
+                contents=contents,
+            )
+        )
+        async with aclosing(stream):
+            async for chunk in stream:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = getattr(chunk, "text", "") or ""
+                if metadata is not None:
+                    metadata += text
+                    continue
+                pending += text
+                marker_at = pending.find(STREAM_METADATA_MARKER)
+                if marker_at >= 0:
+                    metadata = pending[marker_at + len(STREAM_METADATA_MARKER):]
+                    pending = pending[:marker_at]
+                # Hold back a possible partial marker at the end of the buffer
+                safe = len(pending) if metadata is not None else max(0, len(pending) - len(STREAM_METADATA_MARKER))
+                if safe:
+                    if first_token:
+                        STAGE_SECONDS.observe(time.perf_counter() - start, "answer_first_token")
+                        first_token = False
+                    answer_parts.append(pending[:safe])
+                    yield {"type": "token", "text": pending[:safe]}
+                    pending = pending[safe:]
+        if pending:
+            answer_parts.append(pending)
+            yield {"type": "token", "text": pending}
+
+        STAGE_SECONDS.observe(time.perf_counter() - start, "answer_stream")
+        _record_usage(usage)
+        record_bytes(
+            "gemini",
+            sent=_payload_bytes(contents),
+            received=len("".join(answer_parts).encode("utf-8")) + len((metadata or "").encode("utf-8")),
+        )
+
+        result = _parse_stream_metadata("".join(answer_parts).strip(), metadata or "", review_threshold)
+        yield {"type": "result", "rag_result": result}
+
+    def _answer_precheck(self, context_chunks: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         if not self._ensure_client():
             return {
                 "answer": "",
@@ -164,146 +378,165 @@ class GeminiClient:
                 "citations": [],
                 "needs_human_review": True,
             }
+        return None
 
-        context_lines: List[str] = []
-        for i, ch in enumerate(context_chunks):
-            # ContextChunk may be a Pydantic model; normalize to dict-like access.
-            if hasattr(ch, "dict"):
-                ch_data = ch.dict()
-            elif isinstance(ch, dict):
-                ch_data = ch
-            else:
-                ch_data = {
-                    "source": getattr(ch, "source", ""),
-                    "chunk_index": getattr(ch, "chunk_index", -1),
-                    "text": getattr(ch, "text", ""),
-                }
-
-            context_lines.append(
-                f"[{i}] source={ch_data.get('source','')}, chunk_index={ch_data.get('chunk_index', -1)}\n{ch_data.get('text','')}\n"
-            )
-        context_text = "\n\n".join(context_lines)
 
-        system_prompt = """
-You are an answer-generation agent for a Retrieval-Augmented Generation (RAG) system.
+def _record_generation(contents: Any, response: Any) -> None:
+    _record_usage(getattr(response, "usage_metadata", None))
+    text = getattr(response, "text", "") or ""
+    record_bytes("gemini", sent=_payload_bytes(contents), received=len(text.encode("utf-8")))
 
-You are given:
-- a user's question
-- a set of context chunks extracted from the user's private documents
 
-Rules:
-1. Use ONLY the provided context to answer. Do NOT use outside knowledge.
-2. If the answer is not clearly supported by the context, say:
-   "I cannot answer this based on the provided context."
-3. Be concise and factual.
-4. Provide a confidence score between 0.0 and 1.0 that reflects how well the context supports your answer, so if you are not sure with you answer or the question than just give me actual confidence score.
-5. Provide citations: a list of objects { "source": string, "chunk_index": number } corresponding to the chunks you used.
-6. if the confidence score is below 0.6, needs_human_review must be true.
-
-Return ONLY valid JSON in this exact format:
-
-{
-  "answer": "<string>",
-  "confidence": <float between 0 and 1>,
-  "citations": [
-    { "source": "<string>", "chunk_index": <number> }
-  ],
-  "needs_human_review": <boolean>
-}
-"""
-
-        prompt_text = (
-            system_prompt
-            + "\n\nQuestion:\n"
-            + question
-            + "\n\nContext Chunks:\n"
-            + context_text
-        )
-
-        response = self.client.models.generate_content(
-            model=self.text_model_name,
-            contents=prompt_text,
+def _record_usage(usage: Any) -> None:
+    if usage is not None:
+        record_tokens(
+            "gemini",
+            prompt=getattr(usage, "prompt_token_count", None),
+            completion=getattr(usage, "candidates_token_count", None),
         )
 
-        raw = (getattr(response, "text", "") or "").strip()
-
-        # Strip code block wrapper if present (```json ... ```)
-        if raw.startswith("```"):
-            lines = raw.split("\n")
-            # Remove first line (```json or similar) and last line (```)
-            if len(lines) > 2:
-                raw = "\n".join(lines[1:-1])
-            elif lines[0].startswith("```"):
-                raw = lines[0][3:]  # Remove leading ```
-            if raw.startswith("json"):
-                raw = raw[4:].strip()
 
-        try:
-            parsed = json.loads(raw)
-            answer = parsed.get("answer", "")
-            try:
-                confidence = float(parsed.get("confidence", 0.0) or 0.0)
-            except Exception:
-                confidence = 0.0
-            citations = parsed.get("citations", [])
-        except json.JSONDecodeError:
-            # Fallback: assign confidence=0.5
-            answer = raw
-            confidence = 0.5
-            citations = []
-
-        # Always check if review is needed based on threshold
-        needs_human_review = confidence < review_threshold
-
-        result = {
-            "answer": answer,
-            "confidence": confidence,
-            "citations": citations,
-            "needs_human_review": needs_human_review,
+def _payload_bytes(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_payload_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_payload_bytes(v) for v in value)
+    return 0
+
+
+def _response_text(response: Any) -> str:
+    return (getattr(response, "text", "") or "").strip()
+
+
+def _file_extract_contents(mime_type: str, data: bytes) -> List[Dict[str, Any]]:
+    prompt = (
+        "You are a document text extractor. "
+        "Read the content of the attached file and return ONLY the plain text content, "
+        "with no formatting, explanations, or extra commentary."
+        "you can recive files can be image, pdf, docx, txt, video etc."
+    )
+    return [
+        {
+            "role": "user",
+            "parts": [
+                {
+                    "inline_data": {
+                        "mime_type": mime_type,
+                        "data": data,
+                    }
+                },
+                {"text": prompt},
+            ],
         }
-
-        # If human review is needed, generate a context-aware follow-up question using LLM
-        if needs_human_review:
-            followup_question = self.generate_followup_question(question, context_chunks, answer)
-            result["followup_question"] = followup_question
-
-        return result
-
-    def generate_followup_question(self, question: str, context_chunks: List[Dict[str, Any]], answer: str = "") -> str:
-        """
-        Use Gemini LLM to generate a context-aware follow-up question for the user if human review is needed.
-        """
-        if not self._ensure_client():
-            return "Can you clarify or provide more details?"
-
-        # Build context for LLM
-        context_lines = []
-        for i, ch in enumerate(context_chunks):
-            context_lines.append(
-                f"[{i}] source={ch.get('source','')}, chunk_index={ch.get('chunk_index', -1)}\n{ch.get('text','')}\n"
-            )
-        context_text = "\n\n".join(context_lines)
-
-        prompt = (
-            "You are an assistant helping a user with document Q&A. "
-            "The previous answer is the model's best guess but may be incomplete or unreliable. "
-            "Your job is to ask one natural-sounding follow-up question that helps clarify the user's original question so the next answer can be more accurate. "
-            "Base the follow-up on the mismatch between the user's question and the previous answer, and use the context chunks only as needed for grounding. "
-            "Ask exactly one question in plain language.\n"
-            f"Original question: {question}\n"
-            f"Previous answer: {answer}\n"
-            f"Context chunks:\n{context_text}"
-        )
-        contents = [
-            {
-                "role": "user",
-                "parts": [
-                    {"text": prompt},
-                ],
+    ]
+
+
+def _answer_prompt(
+    question: str,
+    context_chunks: List[Dict[str, Any]],
+    system_prompt: str = ANSWER_SYSTEM_PROMPT,
+) -> str:
+    context_lines: List[str] = []
+    for i, ch in enumerate(context_chunks):
+        # ContextChunk may be a Pydantic model; normalize to dict-like access.
+        if hasattr(ch, "dict"):
+            ch_data = ch.dict()
+        elif isinstance(ch, dict):
+            ch_data = ch
+        else:
+            ch_data = {
+                "source": getattr(ch, "source", ""),
+                "chunk_index": getattr(ch, "chunk_index", -1),
+                "text": getattr(ch, "text", ""),
             }
-        ]
-        response = self.client.models.generate_content(
-            model=self.text_model_name,
-            contents=contents,
+
+        context_lines.append(
+            f"[{i}] source={ch_data.get('source','')}, chunk_index={ch_data.get('chunk_index', -1)}\n{ch_data.get('text','')}\n"
         )
-        return (getattr(response, "text", "") or "Can you clarify your question?").strip()
+    context_text = "\n\n".join(context_lines)
+
+    return (
+        system_prompt
+        + "\n\nQuestion:\n"
+        + question
+        + "\n\nContext Chunks:\n"
+        + context_text
+    )
+
+
+def _parse_answer(raw: str, review_threshold: float) -> Dict[str, Any]:
+    # Strip code block wrapper if present (```json ... ```)
+    if raw.startswith("```"):
+        lines = raw.split("\n")
+        # Remove first line (```json or similar) and last line (```)
+        if len(lines) > 2:
+            raw = "\n".join(lines[1:-1])
+        elif lines[0].startswith("```"):
+            raw = lines[0][3:]  # Remove leading ```
+        if raw.startswith("json"):
+            raw = raw[4:].strip()
+
+    try:
+        parsed = json.loads(raw)
+        answer = parsed.get("answer", "")
+        try:
+            confidence = float(parsed.get("confidence", 0.0) or 0.0)
+        except Exception:
+            confidence = 0.0
+        citations = parsed.get("citations", [])
+        followup_question = parsed.get("followup_question") or ""
+    except json.JSONDecodeError:
+        # Fallback: assign confidence=0.5
+        answer = raw
+        confidence = 0.5
+        citations = []
+        followup_question = ""
+
+    # Always check if review is needed based on threshold
+    needs_human_review = confidence < review_threshold
+
+    result = {
+        "answer": answer,
+        "confidence": confidence,
+        "citations": citations,
+        "needs_human_review": needs_human_review,
+    }
+    if needs_human_review:
+        result["followup_question"] = followup_question.strip() or DEFAULT_FOLLOWUP_QUESTION
+    return result
+
+
+def _parse_stream_metadata(answer: str, raw_metadata: str, review_threshold: float) -> Dict[str, Any]:
+    raw = raw_metadata.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`").strip()
+        if raw.startswith("json"):
+            raw = raw[4:].strip()
+
+    try:
+        parsed = json.loads(raw)
+        try:
+            confidence = float(parsed.get("confidence", 0.0) or 0.0)
+        except Exception:
+            confidence = 0.0
+        citations = parsed.get("citations", [])
+        followup_question = parsed.get("followup_question") or ""
+    except (json.JSONDecodeError, AttributeError):
+        # Same fallback as _parse_answer when the model ignores the format
+        confidence = 0.5
+        citations = []
+        followup_question = ""
+
+    result = {
+        "answer": answer,
+        "confidence": confidence,
+        "citations": citations,
+        "needs_human_review": confidence < review_threshold,
+    }
+    if result["needs_human_review"]:
+        result["followup_question"] = followup_question.strip() or DEFAULT_FOLLOWUP_QUESTION
+    return result
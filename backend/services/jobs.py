@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", ".cache/jobs.sqlite3")
+JOBS_SPOOL_DIR = os.getenv("JOBS_SPOOL_DIR", ".cache/job_files")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+
+class JobStore:
+    """
+    SQLite-backed queue of ingestion jobs and their per-file progress.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                workspace_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                filename TEXT,
+                content_type TEXT,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                chunks_total INTEGER NOT NULL DEFAULT 0,
+                chunks_indexed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+            """
+        )
+
+    def create_job(self, workspace_id: str, files: List[Dict[str, Any]]) -> str:
+        job_id = uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO jobs (id, workspace_id, status, created) VALUES (?, ?, 'queued', ?)",
+                (job_id, workspace_id, time.time()),
+            )
+            self._conn.executemany(
+                "INSERT INTO job_files (job_id, idx, filename, content_type, path, status)"
+                " VALUES (?, ?, ?, ?, ?, 'queued')",
+                [
+                    (job_id, idx, f["filename"], f["content_type"], f["path"])
+                    for idx, f in enumerate(files)
+                ],
+            )
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Mark the oldest queued job as running and return it. Jobs of a
+        workspace that already has one running are skipped, so a workspace's
+        uploads are indexed one after another.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', started = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND workspace_id NOT IN"
+                " (SELECT workspace_id FROM jobs WHERE status = 'running') ORDER BY created LIMIT 1)"
+                " RETURNING id, workspace_id",
+                (time.time(),),
+            ).fetchone()
+            if row is None:
+                return None
+            files = self._conn.execute(
+                "SELECT idx, filename, content_type, path FROM job_files WHERE job_id = ? ORDER BY idx",
+                (row["id"],),
+            ).fetchall()
+        return {
+            "id": row["id"],
+            "workspace_id": row["workspace_id"],
+            "files": [dict(f) for f in files],
+        }
+
+    def requeue_interrupted(self) -> None:
+        """Put jobs that were running when the process died back in the queue."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+
+    def update_file(self, job_id: str, idx: int, **fields: Any) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE job_files SET {columns} WHERE job_id = ? AND idx = ?",
+                (*fields.values(), job_id, idx),
+            )
+
+    def add_indexed(self, job_id: str, idx: int, count: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_files SET chunks_indexed = chunks_indexed + ? WHERE job_id = ? AND idx = ?",
+                (count, job_id, idx),
+            )
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            files = self._conn.execute(
+                "SELECT idx, filename, status, chunks_total, chunks_indexed, error"
+                " FROM job_files WHERE job_id = ? ORDER BY idx",
+                (job_id,),
+            ).fetchall()
+
+        files = [dict(f) for f in files]
+        chunks_indexed = sum(f["chunks_indexed"] for f in files)
+        elapsed = None
+        if job["started"]:
+            elapsed = (job["finished"] or time.time()) - job["started"]
+
+        return {
+            "job_id": job["id"],
+            "workspace_id": job["workspace_id"],
+            "status": job["status"],
+            "error": job["error"],
+            "files_total": len(files),
+            "files_done": sum(1 for f in files if f["status"] in ("done", "failed")),
+            "chunks_total": sum(f["chunks_total"] for f in files),
+            "chunks_indexed": chunks_indexed,
+            "elapsed_seconds": elapsed,
+            "chunks_per_second": chunks_indexed / elapsed if elapsed else None,
+            "errors": [
+                {"filename": f["filename"], "error": f["error"]} for f in files if f["error"]
+            ],
+            "files": files,
+        }
+
+
+class JobProgress:
+    """
+    Handed to the job handler to record per-file and per-chunk progress.
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def file_started(self, idx: int) -> None:
+        self.store.update_file(self.job_id, idx, status="running")
+
+    def file_chunked(self, idx: int, chunks_total: int) -> None:
+        self.store.update_file(self.job_id, idx, chunks_total=chunks_total)
+
+    def chunks_indexed(self, idx: int, count: int) -> None:
+        """Add a batch of chunks that has just been written for a file."""
+        self.store.add_indexed(self.job_id, idx, count)
+
+    def file_done(self, idx: int) -> None:
+        self.store.update_file(self.job_id, idx, status="done")
+
+    def file_failed(self, idx: int, error: str) -> None:
+        self.store.update_file(self.job_id, idx, status="failed", error=error)
+
+
+JobHandler = Callable[[Dict[str, Any], JobProgress], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    Runs queued ingestion jobs on a pool of asyncio worker tasks. Uploaded
+    files are spooled to JOBS_SPOOL_DIR so the HTTP request can return as
+    soon as they are on disk; the spool is removed when the job finishes.
+    """
+
+    def __init__(
+        self,
+        handler: JobHandler,
+        store: Optional[JobStore] = None,
+        workers: int = JOB_WORKERS,
+        spool_dir: str = JOBS_SPOOL_DIR,
+    ):
+        self.handler = handler
+        self.store = store or JobStore()
+        self.workers = max(1, workers)
+        self.spool_dir = spool_dir
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self.store.requeue_interrupted()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, workspace_id: str, files: List[UploadFile]) -> str:
+        job_dir = os.path.join(self.spool_dir, uuid4().hex)
+        os.makedirs(job_dir, exist_ok=True)
+        spooled = []
+        for idx, f in enumerate(files):
+            path = os.path.join(job_dir, str(idx))
+            await asyncio.to_thread(_copy_upload, f, path)
+            spooled.append({"filename": f.filename, "content_type": f.content_type, "path": path})
+
+        job_id = self.store.create_job(workspace_id, spooled)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def wait(self, job_id: str, poll_interval: float = 0.2) -> Dict[str, Any]:
+        while True:
+            job = self.store.get_job(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                return job
+            await asyncio.sleep(poll_interval)
+
+    async def _worker(self) -> None:
+        while True:
+            job = self.store.claim_next()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            # Let the other workers look for more queued jobs
+            self._wakeup.set()
+            await self._run(job)
+            # Jobs of this workspace that were skipped can run now
+            self._wakeup.set()
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        try:
+            await self.handler(job, JobProgress(self.store, job["id"]))
+            self.store.finish_job(job["id"], "done")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("Ingestion job %s failed", job["id"])
+            self.store.finish_job(job["id"], "failed", str(exc))
+        if job["files"]:
+            shutil.rmtree(os.path.dirname(job["files"][0]["path"]), ignore_errors=True)
+
+
+def _copy_upload(upload: UploadFile, path: str) -> None:
+    upload.file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(upload.file, out, 1024 * 1024)
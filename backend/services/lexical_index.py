@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from services.chunk_store import get_chunk_store
+from services.metrics import stage
+
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", ".cache/lexical")
+# Workspace indexes held in memory at once; the rest stay on disk
+LEXICAL_MAX_WORKSPACES = int(os.getenv("LEXICAL_MAX_WORKSPACES", "32"))
+# Rewrite a workspace's index once this fraction of its rows is dead
+LEXICAL_COMPACT_RATIO = float(os.getenv("LEXICAL_COMPACT_RATIO", "0.3"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Identifiers such as "PN-1234" or "v2.5" are kept whole, and their parts are
+# indexed as well so "1234" still matches.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it of on or that the this to was were what when where "
+    "which who why will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+    compound = [t for t in tokens if not t.isalnum()]
+    for token in compound:
+        tokens.extend(p for p in _SPLIT_RE.split(token) if p and p not in _STOPWORDS)
+    return tokens
+
+
+class WorkspaceLexicalIndex:
+    """
+    In-memory BM25 inverted index over one workspace's chunks, persisted as an
+    append-only JSONL file of per-chunk term counts and deletions. Only chunk
+    ids, their filename/chunk_index and term data are kept; the texts of the
+    top hits are read from the chunk store. Posting lists are turned into
+    NumPy arrays on first query so scoring is vectorized. Deleted or
+    superseded chunks are masked out of results and left out of the BM25
+    statistics; once they make up LEXICAL_COMPACT_RATIO of the rows, the
+    file and postings are rewritten without them.
+
+    The file is read on first use rather than on construction, and every
+    method holds ``lock``, so the index can be loaded and updated from worker
+    threads.
+    """
+
+    def __init__(self, path: str, lock: Optional[threading.Lock] = None):
+        self.path = path
+        self.lock = lock or threading.Lock()
+        self._loaded = False
+        self._reset()
+
+    def _reset(self) -> None:
+        # Per row: (chunk_id, filename, chunk_index)
+        self.docs: List[Tuple[str, str, int]] = []
+        self._doc_lens: List[int] = []
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lens: Optional[np.ndarray] = None
+        self._alive: List[bool] = []
+        self._alive_mask: Optional[np.ndarray] = None
+        self._row_by_id: Dict[str, int] = {}
+        # BM25 statistics over live rows only
+        self._n_alive = 0
+        self._alive_len = 0
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if "deleted" in record:
+                        self._kill(record["deleted"])
+                    else:
+                        if "terms" not in record:
+                            # Files written before term data was stored carry the text
+                            record["terms"] = Counter(tokenize(record.pop("text", "")))
+                        self._index(record)
+        self._maybe_compact()
+
+    def add(self, payloads: Sequence[Dict[str, Any]]) -> None:
+        if not payloads:
+            return
+        records = [
+            {
+                "chunk_id": payload.get("chunk_id"),
+                "filename": payload.get("filename", ""),
+                "chunk_index": payload.get("chunk_index", -1),
+                "terms": Counter(tokenize(payload.get("text", ""))),
+            }
+            for payload in payloads
+        ]
+        with self.lock:
+            self._load()
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            for record in records:
+                self._index(record)
+            self._arrays.clear()
+            self._lens = None
+            self._alive_mask = None
+            self._maybe_compact()
+
+    def remove(self, chunk_ids: Sequence[str]) -> None:
+        with self.lock:
+            self._load()
+            chunk_ids = [c for c in chunk_ids if c in self._row_by_id]
+            if not chunk_ids:
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                for chunk_id in chunk_ids:
+                    f.write(json.dumps({"deleted": chunk_id}) + "\n")
+            for chunk_id in chunk_ids:
+                self._kill(chunk_id)
+            self._alive_mask = None
+            self._maybe_compact()
+
+    def _kill(self, chunk_id: str) -> None:
+        row = self._row_by_id.pop(chunk_id, None)
+        if row is not None:
+            self._alive[row] = False
+            self._n_alive -= 1
+            self._alive_len -= self._doc_lens[row]
+
+    def _maybe_compact(self) -> None:
+        rows = len(self.docs)
+        if not rows or (rows - self._n_alive) / rows < LEXICAL_COMPACT_RATIO:
+            return
+        live = [row for row in range(rows) if self._alive[row]]
+        terms: Dict[int, Dict[str, int]] = {row: {} for row in live}
+        for term, (ids, tfs) in self._postings.items():
+            for row, tf in zip(ids, tfs):
+                row_terms = terms.get(row)
+                if row_terms is not None:
+                    row_terms[term] = tf
+        records = []
+        for row in live:
+            chunk_id, filename, chunk_index = self.docs[row]
+            records.append(
+                {"chunk_id": chunk_id, "filename": filename, "chunk_index": chunk_index, "terms": terms[row]}
+            )
+        # The rewrite replaces the file in one step, so a crash keeps the old one
+        tmp_path = self.path + ".compact"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+        self._reset()
+        for record in records:
+            self._index(record)
+
+    def _index(self, record: Dict[str, Any]) -> None:
+        doc_id = len(self.docs)
+        self._alive.append(True)
+        chunk_id = record.get("chunk_id")
+        if chunk_id:
+            self._kill(chunk_id)
+            self._row_by_id[chunk_id] = doc_id
+        counts: Dict[str, int] = record["terms"]
+        self.docs.append((chunk_id, record.get("filename", ""), record.get("chunk_index", -1)))
+        length = sum(counts.values())
+        self._doc_lens.append(length)
+        self._n_alive += 1
+        self._alive_len += length
+        postings = self._postings
+        for term, tf in counts.items():
+            posting = postings.get(term)
+            if posting is None:
+                postings[term] = ([doc_id], [tf])
+            else:
+                posting[0].append(doc_id)
+                posting[1].append(tf)
+
+    def _term_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self._postings.get(term)
+            if posting is None:
+                return None
+            arrays = (np.asarray(posting[0], dtype=np.int64), np.asarray(posting[1], dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+        terms = set(tokenize(query))
+        with self.lock:
+            self._load()
+            hits = self._search(terms, limit)
+        texts = get_chunk_store().get_many([h[1]["chunk_id"] for h in hits if h[1]["chunk_id"]])
+        for _, hit in hits:
+            hit["text"] = texts.get(hit["chunk_id"], "")
+        # A chunk whose text has not reached the chunk store yet is useless as context
+        return [(score, hit) for score, hit in hits if hit["text"]]
+
+    def _search(self, terms: Set[str], limit: int) -> List[Tuple[float, Dict[str, Any]]]:
+        n_docs = self._n_alive
+        if not n_docs or not terms:
+            return []
+        if self._lens is None:
+            self._lens = np.asarray(self._doc_lens, dtype=np.float32)
+        if self._alive_mask is None:
+            self._alive_mask = np.asarray(self._alive, dtype=bool)
+
+        avg_len = self._alive_len / n_docs or 1.0
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in terms:
+            arrays = self._term_arrays(term)
+            if arrays is None:
+                continue
+            ids, tfs = arrays
+            live = self._alive_mask[ids]
+            ids, tfs = ids[live], tfs[live]
+            if not len(ids):
+                continue
+            idf = math.log(1.0 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._lens[ids] / avg_len)
+            scores[ids] += idf * tfs * (BM25_K1 + 1.0) / (tfs + norm)
+
+        limit = min(limit, n_docs)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self._hit(i)) for i in top if scores[i] > 0]
+
+    def _hit(self, row: int) -> Dict[str, Any]:
+        chunk_id, filename, chunk_index = self.docs[row]
+        return {"chunk_id": chunk_id, "filename": filename, "chunk_index": chunk_index}
+
+
+# Workspace indexes kept in memory, least recently used first; evicted ones
+# are reloaded from disk on next use. Locks outlive eviction so a reload
+# cannot interleave with a write still going through the old instance.
+_indexes: "OrderedDict[str, WorkspaceLexicalIndex]" = OrderedDict()
+_locks: Dict[str, threading.Lock] = {}
+_indexes_lock = threading.Lock()
+
+
+def _index_path(workspace_id: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", workspace_id)[:64]
+    digest = hashlib.sha1(workspace_id.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(LEXICAL_INDEX_DIR, f"{safe}-{digest}.jsonl")
+
+
+def get_index(workspace_id: str) -> WorkspaceLexicalIndex:
+    """The workspace's index; it loads from disk on first use, so call that from a worker thread."""
+    with _indexes_lock:
+        index = _indexes.get(workspace_id)
+        if index is None:
+            lock = _locks.setdefault(workspace_id, threading.Lock())
+            index = WorkspaceLexicalIndex(_index_path(workspace_id), lock)
+            _indexes[workspace_id] = index
+            while len(_indexes) > max(1, LEXICAL_MAX_WORKSPACES):
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(workspace_id)
+    return index
+
+
+def index_chunks(workspace_id: str, payloads: Sequence[Dict[str, Any]]) -> None:
+    with stage("lexical_index"):
+        get_index(workspace_id).add(payloads)
+
+
+def remove_chunks(workspace_id: str, chunk_ids: Sequence[str]) -> None:
+    with stage("lexical_remove"):
+        get_index(workspace_id).remove(chunk_ids)
+
+
+def search_lexical(workspace_id: str, query: str, limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+    with stage("lexical_search"):
+        return get_index(workspace_id).search(query, limit)
+
+
+# Tokenizing, loading a cold index and scoring are CPU-bound; the async
+# variants keep them off the event loop
+
+async def aindex_chunks(workspace_id: str, payloads: Sequence[Dict[str, Any]]) -> None:
+    await asyncio.to_thread(index_chunks, workspace_id, payloads)
+
+
+async def aremove_chunks(workspace_id: str, chunk_ids: Sequence[str]) -> None:
+    await asyncio.to_thread(remove_chunks, workspace_id, chunk_ids)
+
+
+async def asearch_lexical(workspace_id: str, query: str, limit: int = 5) -> List[Tuple[float, Dict[str, Any]]]:
+    return await asyncio.to_thread(search_lexical, workspace_id, query, limit)
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[Hashable, Dict[str, Any]]]],
+    limit: int = 5,
+    k: int = 60,
+) -> List[Dict[str, Any]]:
+    """
+    Fuse several ranked lists of (key, payload) with reciprocal rank fusion
+    and return the top ``limit`` payloads.
+    """
+    scores: Dict[Hashable, float] = {}
+    payloads: Dict[Hashable, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, (key, payload) in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            payloads.setdefault(key, payload)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [payloads[key] for key in ordered[:limit]]
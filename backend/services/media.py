@@ -0,0 +1,193 @@
+import asyncio
+import io
+import mimetypes
+import os
+import wave
+from dataclasses import dataclass
+from importlib.util import find_spec
+from typing import Any, Dict, List, Optional
+
+from services.aiml_client import AimlClient
+from services.content_cache import ContentCache, afile_hash
+from services.extractors import PDF_AVAILABLE, extract_locally, resolve_mime_type
+from services.metrics import stage
+
+MEDIA_PIPELINE_ENABLED = os.getenv("MEDIA_PIPELINE_ENABLED", "1") not in ("0", "false", "False")
+# Segments of one file sent to OCR/transcription at once; AIML_MAX_CONCURRENCY
+# still caps the total across files
+MEDIA_SEGMENT_CONCURRENCY = int(os.getenv("MEDIA_SEGMENT_CONCURRENCY", "4"))
+MEDIA_AUDIO_SEGMENT_SECONDS = float(os.getenv("MEDIA_AUDIO_SEGMENT_SECONDS", "60"))
+
+# Content-cache key for text assembled by this pipeline
+MEDIA_CACHE_MODEL = "aiml-media"
+
+PIL_AVAILABLE = find_spec("PIL") is not None
+
+WAV_MIME_TYPES = {"audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave"}
+
+
+@dataclass
+class Segment:
+    """One independently transcribable piece of a media file."""
+
+    kind: str  # "ocr" or "audio"
+    data: bytes
+    content_type: str
+    filename: str
+
+
+def is_media(mime_type: str) -> bool:
+    return mime_type.startswith(("image/", "audio/")) or mime_type == "application/pdf"
+
+
+def split_media(mime_type: str, data: bytes, filename: str = "file") -> Optional[List[Segment]]:
+    """
+    Split a file into segments in reading order: WAV audio into fixed-length
+    chunks, multi-frame images (TIFF scans) into pages, and scanned PDFs into
+    their page images. Other images and audio become a single segment.
+    Returns None when the file cannot be split into something OCR or
+    transcription can take.
+    """
+    if mime_type in WAV_MIME_TYPES:
+        return _split_wav(data, filename) or [Segment("audio", data, mime_type, filename)]
+    if mime_type.startswith("audio/"):
+        return [Segment("audio", data, mime_type, filename)]
+    if mime_type.startswith("image/"):
+        return _split_frames(data, filename) or [Segment("ocr", data, mime_type, filename)]
+    if mime_type == "application/pdf":
+        return _split_pdf(data, filename)
+    return None
+
+
+def _split_wav(data: bytes, filename: str) -> Optional[List[Segment]]:
+    try:
+        with wave.open(io.BytesIO(data)) as src:
+            params = src.getparams()
+            frames_per_segment = max(1, int(src.getframerate() * MEDIA_AUDIO_SEGMENT_SECONDS))
+            if src.getnframes() <= frames_per_segment:
+                return None
+            segments = []
+            while True:
+                frames = src.readframes(frames_per_segment)
+                if not frames:
+                    break
+                buf = io.BytesIO()
+                with wave.open(buf, "wb") as dst:
+                    dst.setparams(params)
+                    dst.writeframes(frames)
+                segments.append(Segment("audio", buf.getvalue(), "audio/wav", f"{filename}.{len(segments)}.wav"))
+            return segments
+    except (wave.Error, EOFError):
+        # Compressed or float WAVs that the wave module cannot read go whole
+        return None
+
+
+def _split_frames(data: bytes, filename: str) -> Optional[List[Segment]]:
+    if not PIL_AVAILABLE:
+        return None
+    from PIL import Image, ImageSequence
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if getattr(image, "n_frames", 1) <= 1:
+                return None
+            segments = []
+            for frame in ImageSequence.Iterator(image):
+                buf = io.BytesIO()
+                frame.convert("RGB").save(buf, format="PNG")
+                segments.append(Segment("ocr", buf.getvalue(), "image/png", f"{filename}.{len(segments)}.png"))
+            return segments
+    except Exception:
+        return None
+
+
+def _split_pdf(data: bytes, filename: str) -> Optional[List[Segment]]:
+    """Scanned PDFs hold one (or a few) images per page; OCR those in order."""
+    if not PDF_AVAILABLE:
+        return None
+    from pypdf import PdfReader
+
+    try:
+        segments = []
+        for page in PdfReader(io.BytesIO(data)).pages:
+            images = list(page.images)
+            # A page without images would silently lose content
+            if not images:
+                return None
+            for image in images:
+                content_type = mimetypes.guess_type(image.name)[0] or "image/png"
+                segments.append(Segment("ocr", image.data, content_type, f"{filename}.{len(segments)}.{image.name}"))
+        return segments or None
+    except Exception:
+        return None
+
+
+class MediaPipeline:
+    """
+    Turns images, scans and audio into text with AIML OCR/transcription.
+    Files are split into segments that are processed concurrently and
+    reassembled in order, so a long recording or scan takes about as long as
+    its slowest segment. A segment AIML cannot handle is sent to Gemini on
+    its own; a file that cannot be split goes to Gemini whole.
+    """
+
+    def __init__(self, gemini_client: Any, aiml: Optional[AimlClient] = None, cache: Optional[ContentCache] = None):
+        self.gemini_client = gemini_client
+        self.aiml = aiml if aiml is not None else AimlClient()
+        self.cache = cache if cache is not None else getattr(gemini_client, "cache", None)
+
+    @property
+    def enabled(self) -> bool:
+        return MEDIA_PIPELINE_ENABLED and bool(self.aiml.api_key)
+
+    async def aextract_text(self, file_obj: Dict[str, Any]) -> Optional[str]:
+        """Text for a media file, or None when the caller should use its usual path."""
+        mime_type = resolve_mime_type(file_obj.get("content_type"), file_obj.get("filename"))
+        if not self.enabled or not is_media(mime_type):
+            return None
+        data = file_obj["data"]
+        filename = file_obj.get("filename") or "file"
+
+        # PDFs with a text layer never need OCR
+        if mime_type == "application/pdf":
+            local_text = await asyncio.to_thread(extract_locally, mime_type, data, filename)
+            if local_text is not None:
+                return local_text
+
+        digest = await afile_hash(file_obj) if self.cache else None
+        if digest is not None:
+            cached = await asyncio.to_thread(self.cache.get_text, digest, MEDIA_CACHE_MODEL)
+            if cached is not None:
+                return cached
+
+        with stage("media_split"):
+            segments = await asyncio.to_thread(split_media, mime_type, data, filename)
+        if not segments:
+            return None
+
+        semaphore = asyncio.Semaphore(max(1, MEDIA_SEGMENT_CONCURRENCY))
+
+        async def transcribe(segment: Segment) -> str:
+            async with semaphore:
+                return await self._segment_text(segment)
+
+        with stage("media_extract"):
+            texts = await asyncio.gather(*(transcribe(segment) for segment in segments))
+        text = "\n".join(t.strip() for t in texts if t and t.strip())
+        if text and digest is not None:
+            await asyncio.to_thread(self.cache.set_text, digest, MEDIA_CACHE_MODEL, text)
+        return text
+
+    async def _segment_text(self, segment: Segment) -> str:
+        if segment.kind == "audio":
+            with stage("media_transcribe"):
+                text = await self.aiml.aaudio_to_text(segment.data, segment.filename, segment.content_type)
+        else:
+            with stage("media_ocr"):
+                text = await self.aiml.aocr_image_to_text(segment.data, segment.filename, segment.content_type)
+        if text:
+            return text
+        with stage("media_fallback"):
+            return await self.gemini_client.aextract_text_from_file(
+                {"content_type": segment.content_type, "data": segment.data, "filename": segment.filename}
+            )
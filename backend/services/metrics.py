@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Optional OpenTelemetry tracing; metrics work without it
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+OTEL_ENABLED = os.getenv("OTEL_ENABLED", "").lower() in ("1", "true", "yes")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "autorag-backend")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans cache hits (~1ms) up to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+REGISTRY: List["Metric"] = []
+
+
+class Metric:
+    """
+    Base for the minimal Prometheus-style metrics below. Label values are
+    passed positionally in ``labelnames`` order; every update is a dict
+    lookup and an add under a lock, cheap enough to leave on in production.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _labels(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._labels(k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][slot] += 1
+            entry[1][0] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(counts), total[0]) for k, (counts, total) in self._values.items()]
+        lines = []
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else _number(bound))
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+STAGE_SECONDS = Histogram(
+    "autorag_stage_seconds", "Time spent in each pipeline stage.", ["stage"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "autorag_http_request_seconds", "HTTP request latency by route.", ["method", "route", "status"]
+)
+HTTP_IN_FLIGHT = Gauge("autorag_http_requests_in_flight", "HTTP requests currently being served.")
+PROVIDER_CALL_SECONDS = Histogram(
+    "autorag_provider_call_seconds", "Latency of single attempts against external providers.", ["provider"]
+)
+PROVIDER_CALLS = Counter(
+    "autorag_provider_calls_total",
+    "Attempts against external providers by outcome (ok, retry, error, circuit_open).",
+    ["provider", "outcome"],
+)
+PROVIDER_IN_FLIGHT = Gauge(
+    "autorag_provider_calls_in_flight", "Provider attempts currently waiting on the network.", ["provider"]
+)
+PROVIDER_TOKENS = Counter(
+    "autorag_provider_tokens_total", "Tokens reported by provider responses.", ["provider", "kind"]
+)
+PROVIDER_BYTES = Counter(
+    "autorag_provider_bytes_total", "Payload bytes sent to and received from providers.", ["provider", "direction"]
+)
+CACHE_REQUESTS = Counter(
+    "autorag_cache_requests_total", "Cache lookups by cache and result (hit, miss).", ["cache", "result"]
+)
+CACHE_EVICTIONS = Counter("autorag_cache_evictions_total", "Live entries evicted to make room.", ["cache"])
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+
+def record_bytes(provider: str, sent: int = 0, received: int = 0) -> None:
+    if sent:
+        PROVIDER_BYTES.inc(provider, "sent", amount=sent)
+    if received:
+        PROVIDER_BYTES.inc(provider, "received", amount=received)
+
+
+def record_tokens(provider: str, prompt: Optional[int] = None, completion: Optional[int] = None) -> None:
+    if prompt:
+        PROVIDER_TOKENS.inc(provider, "prompt", amount=prompt)
+    if completion:
+        PROVIDER_TOKENS.inc(provider, "completion", amount=completion)
+
+
+_tracer = None
+_tracer_provider = None
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block into autorag_stage_seconds, and trace it when OTel is on."""
+    start = time.perf_counter()
+    try:
+        if _tracer is None:
+            yield
+        else:
+            with _tracer.start_as_current_span(name):
+                yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+
+def render_latest() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware recording request latency per route template and
+    the number of in-flight requests. For streaming responses the time runs
+    until the last body chunk has been sent.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the scope; unmatched
+            # paths share one label so they cannot blow up cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status_code))
+
+
+def setup_opentelemetry() -> bool:
+    """
+    Export stage spans over OTLP when OTEL_ENABLED is set and the
+    opentelemetry SDK and OTLP exporter are installed. The exporter reads the
+    standard OTEL_EXPORTER_OTLP_* variables for its endpoint and headers.
+    """
+    global _tracer, _tracer_provider
+    if not OTEL_ENABLED or otel_trace is None or _tracer is not None:
+        return _tracer is not None
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    otel_trace.set_tracer_provider(provider)
+    _tracer_provider = provider
+    _tracer = otel_trace.get_tracer("autorag")
+    return True
+
+
+def shutdown_opentelemetry() -> None:
+    global _tracer, _tracer_provider
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+    _tracer = None
+    _tracer_provider = None
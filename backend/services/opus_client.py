@@ -1,14 +1,15 @@
 import os
 from typing import Dict, Any
 
-import requests
+from services.outbound import get_async_http_client, get_provider, record_response_bytes
 
 OPUS_API_KEY = os.getenv("OPUS_API_KEY", "")
 OPUS_WORKFLOW_ID = os.getenv("OPUS_WORKFLOW_ID", "")
 OPUS_RUN_URL = os.getenv("OPUS_RUN_URL", "https://api.opus.ai/workflow/run")
+OPUS_TIMEOUT = 30
 
 
-def run_review_workflow(question: str, base_result: Dict[str, Any]) -> Dict[str, Any]:
+async def arun_review_workflow(question: str, base_result: Dict[str, Any]) -> Dict[str, Any]:
     """
     Minimal use of Opus: send question + base RAG answer for lightweight review.
     If Opus is not configured or fails, return {} and let backend proceed.
@@ -16,7 +17,28 @@ def run_review_workflow(question: str, base_result: Dict[str, Any]) -> Dict[str,
     if not (OPUS_API_KEY and OPUS_WORKFLOW_ID):
         return {}
 
-    payload = {
+    async def post(timeout: float):
+        resp = await get_async_http_client().post(
+            OPUS_RUN_URL,
+            json=_review_payload(question, base_result),
+            headers=_headers(),
+            timeout=timeout,
+        )
+        record_response_bytes("opus", resp)
+        resp.raise_for_status()
+        return resp.json()
+
+    try:
+        data = await get_provider("opus").call(post, timeout=OPUS_TIMEOUT)
+    except Exception:
+        # If anything goes wrong with Opus, just skip review.
+        return {}
+
+    return _review_result(data, base_result)
+
+
+def _review_payload(question: str, base_result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
         "workflow_id": OPUS_WORKFLOW_ID,
         "input": {
             "question": question,
@@ -26,19 +48,15 @@ def run_review_workflow(question: str, base_result: Dict[str, Any]) -> Dict[str,
         },
     }
 
-    headers = {
+
+def _headers() -> Dict[str, str]:
+    return {
         "Authorization": f"Bearer {OPUS_API_KEY}",
         "Content-Type": "application/json",
     }
 
-    try:
-        resp = requests.post(OPUS_RUN_URL, json=payload, headers=headers, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
-    except Exception:
-        # If anything goes wrong with Opus, just skip review.
-        return {}
 
+def _review_result(data: Dict[str, Any], base_result: Dict[str, Any]) -> Dict[str, Any]:
     # Match your Output node system names:
     approved_answer = data.get("approved_answer") or base_result.get("answer", "")
     needs_human_review = data.get("needs_human_review", False)
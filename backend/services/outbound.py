@@ -0,0 +1,334 @@
+import asyncio
+import contextvars
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+import httpx
+
+from services.metrics import (
+    PROVIDER_CALL_SECONDS,
+    PROVIDER_CALLS,
+    PROVIDER_IN_FLIGHT,
+    record_bytes,
+)
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+T = TypeVar("T")
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))
+
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "20"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+# Absolute time.monotonic() deadline of the request being served, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Bound every outbound call made inside the block (including from tasks and
+    threads started within it) by a shared deadline.
+    """
+    if not seconds:
+        yield
+        return
+    with _deadline_at(time.monotonic() + seconds):
+        yield
+
+
+@contextmanager
+def _deadline_at(deadline: float) -> Iterator[None]:
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+async def aiter_within(iterator: AsyncIterator[T], seconds: Optional[float]) -> AsyncIterator[T]:
+    """
+    Yield from ``iterator`` with every step bounded by one shared deadline.
+    A deadline_scope must not stay open across a yield, so this is how
+    async generators get one. The iterator is closed when this one is.
+    """
+    deadline = time.monotonic() + seconds if seconds else None
+    try:
+        while True:
+            try:
+                if deadline is None:
+                    item = await iterator.__anext__()
+                else:
+                    with _deadline_at(deadline):
+                        item = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        aclose = getattr(iterator, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+def remaining_time() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    # google.genai.errors.APIError and similar expose the HTTP status as .code
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError)):
+        return True
+    return _status_of(exc) in RETRYABLE_STATUS
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Provider:
+    """
+    Policy for calls to one external service: a concurrency limit, retries
+    with full-jitter exponential backoff on 429/5xx/transport errors, a
+    circuit breaker that fails fast after repeated failures, and per-attempt
+    timeouts capped by the current request deadline. Callers whose requests
+    are known to run long (file extraction, transcription) pass their own
+    timeout to ``call``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 8,
+        max_attempts: int = RETRY_MAX_ATTEMPTS,
+        timeout: float = HTTP_TIMEOUT,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.timeout = timeout
+        self._async_slots: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    def _check_breaker(self) -> None:
+        if self._opened_at is None:
+            return
+        if time.monotonic() - self._opened_at < BREAKER_RESET_SECONDS:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        # Half-open: let this call through as a probe
+        self._opened_at = None
+        self._failures = BREAKER_FAILURE_THRESHOLD - 1
+
+    def _check_open(self) -> None:
+        try:
+            self._check_breaker()
+        except CircuitOpenError:
+            PROVIDER_CALLS.inc(self.name, "circuit_open")
+            raise
+
+    def _started(self) -> float:
+        PROVIDER_IN_FLIGHT.inc(self.name)
+        return time.perf_counter()
+
+    def _finished(self, start: float) -> None:
+        PROVIDER_IN_FLIGHT.dec(self.name)
+        PROVIDER_CALL_SECONDS.observe(time.perf_counter() - start, self.name)
+
+    def _record(self, ok: bool) -> None:
+        if ok:
+            self._failures = 0
+            return
+        self._failures += 1
+        if self._failures >= BREAKER_FAILURE_THRESHOLD:
+            self._opened_at = time.monotonic()
+
+    def _attempt_timeout(self, timeout: Optional[float]) -> float:
+        limit = self.timeout if timeout is None else timeout
+        remaining = remaining_time()
+        if remaining is None:
+            return limit
+        if remaining <= 0:
+            raise DeadlineExceeded(f"deadline exceeded before calling {self.name}")
+        return min(limit, remaining)
+
+    def _backoff(self, attempt: int, exc: BaseException) -> Optional[float]:
+        """Delay before the next attempt, or None to give up."""
+        if attempt + 1 >= self.max_attempts or not is_retryable(exc):
+            return None
+        delay = _retry_after(exc)
+        if delay is None:
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return slots
+
+    def _failed(self, attempt: int, exc: BaseException) -> Optional[float]:
+        """Record a failed attempt; return the delay before retrying, or None to give up."""
+        self._record(not is_retryable(exc))
+        delay = self._backoff(attempt, exc)
+        PROVIDER_CALLS.inc(self.name, "error" if delay is None else "retry")
+        return delay
+
+    async def call(self, fn: Callable[[float], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        """Run ``fn(timeout)`` under this provider's policy, ``timeout`` overriding the default per attempt."""
+        slots = self._slots()
+        attempt = 0
+        while True:
+            self._check_open()
+            attempt_timeout = self._attempt_timeout(timeout)
+            try:
+                async with slots:
+                    start = self._started()
+                    try:
+                        result = await asyncio.wait_for(fn(attempt_timeout), attempt_timeout)
+                    finally:
+                        self._finished(start)
+            except Exception as exc:
+                delay = self._failed(attempt, exc)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._record(True)
+            PROVIDER_CALLS.inc(self.name, "ok")
+            return result
+
+    async def stream(
+        self, fn: Callable[[float], Awaitable[AsyncIterator[T]]], timeout: Optional[float] = None
+    ) -> AsyncIterator[T]:
+        """
+        Open a stream with ``fn(timeout)`` and yield its items. Only opening is
+        retried, since items already handed out cannot be taken back. The
+        concurrency slot is held until the stream ends, every read gets the
+        same timeout as an attempt, and the breaker records the outcome of the
+        whole stream rather than just the open.
+        """
+        slots = self._slots()
+        attempt = 0
+        while True:
+            self._check_open()
+            attempt_timeout = self._attempt_timeout(timeout)
+            await slots.acquire()
+            start = self._started()
+            try:
+                stream = await asyncio.wait_for(fn(attempt_timeout), attempt_timeout)
+                break
+            except Exception as exc:
+                self._finished(start)
+                slots.release()
+                delay = self._failed(attempt, exc)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+
+        try:
+            items = stream.__aiter__()
+            while True:
+                try:
+                    item = await asyncio.wait_for(items.__anext__(), self._attempt_timeout(timeout))
+                except StopAsyncIteration:
+                    break
+                yield item
+        except Exception as exc:
+            self._record(not is_retryable(exc))
+            PROVIDER_CALLS.inc(self.name, "error")
+            raise
+        finally:
+            self._finished(start)
+            slots.release()
+        self._record(True)
+        PROVIDER_CALLS.inc(self.name, "ok")
+
+
+def record_response_bytes(provider: str, resp: httpx.Response) -> None:
+    sent = int(resp.request.headers.get("content-length") or 0)
+    record_bytes(provider, sent=sent, received=len(resp.content))
+
+
+_providers: Dict[str, Provider] = {}
+
+
+def get_provider(name: str) -> Provider:
+    provider = _providers.get(name)
+    if provider is None:
+        concurrency = int(os.getenv(f"{name.upper()}_MAX_CONCURRENCY", "8"))
+        provider = _providers[name] = Provider(name, max_concurrency=concurrency)
+    return provider
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+
+
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Process-wide keep-alive client for async calls."""
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_limits(), timeout=HTTP_TIMEOUT)
+    return _async_http_client
+
+
+def set_async_http_client(client: Optional[httpx.AsyncClient]) -> None:
+    """Replace the shared async client, e.g. with one on a mock transport."""
+    global _async_http_client
+    _async_http_client = client
+
+
+async def aclose_http_clients() -> None:
+    global _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
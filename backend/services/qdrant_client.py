@@ -1,69 +1,313 @@
+import asyncio
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from uuid import uuid4
 
-from qdrant_client import QdrantClient, models
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from services.vector_store import VECTOR_SIZE, VectorStore
 
 QDRANT_URL = os.getenv("QDRANT_URL", "")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", "")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "rag_chunks")
+# Embedded mode: a local directory, or ":memory:", instead of a server
+QDRANT_PATH = os.getenv("QDRANT_PATH", "")
 
-VECTOR_SIZE = 768  # must match text-embedding-004
 
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name, "")
+    return int(value) if value else None
 
-_client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
 
-def ensure_collection() -> None:
-    try:
-        _client.get_collection(QDRANT_COLLECTION)
-    except Exception:
-        _client.recreate_collection(
-            collection_name=QDRANT_COLLECTION,
-            vectors_config=models.VectorParams(
-                size=VECTOR_SIZE,
-                distance=models.Distance.COSINE,
-            ),
+
+# Storage and index tuning for large collections. Unset values keep Qdrant's defaults.
+QDRANT_ON_DISK = _env_bool("QDRANT_ON_DISK", False)
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")  # none | scalar | binary
+QDRANT_QUANTIZATION_ALWAYS_RAM = _env_bool("QDRANT_QUANTIZATION_ALWAYS_RAM", True)
+QDRANT_RESCORE = _env_bool("QDRANT_RESCORE", True)
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+QDRANT_HNSW_M = _env_int("QDRANT_HNSW_M")
+QDRANT_HNSW_EF_CONSTRUCT = _env_int("QDRANT_HNSW_EF_CONSTRUCT")
+# Per-tenant graphs: set QDRANT_HNSW_M=0 and QDRANT_HNSW_PAYLOAD_M=16
+QDRANT_HNSW_PAYLOAD_M = _env_int("QDRANT_HNSW_PAYLOAD_M")
+QDRANT_HNSW_EF = _env_int("QDRANT_HNSW_EF")
+QDRANT_TENANT_INDEX = _env_bool("QDRANT_TENANT_INDEX", True)
+
+
+def _vectors_config() -> models.VectorParams:
+    return models.VectorParams(
+        size=VECTOR_SIZE,
+        distance=models.Distance.COSINE,
+        on_disk=QDRANT_ON_DISK or None,
+    )
+
+
+def _quantization_config():
+    if QDRANT_QUANTIZATION == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+            )
         )
+    if QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM)
+        )
+    return None
+
 
+def _hnsw_config() -> Optional[models.HnswConfigDiff]:
+    fields = {
+        "m": QDRANT_HNSW_M,
+        "ef_construct": QDRANT_HNSW_EF_CONSTRUCT,
+        "payload_m": QDRANT_HNSW_PAYLOAD_M,
+    }
+    fields = {k: v for k, v in fields.items() if v is not None}
+    return models.HnswConfigDiff(**fields) if fields else None
+
+
+def _search_params() -> Optional[models.SearchParams]:
+    quantization = None
+    if QDRANT_QUANTIZATION != "none":
+        quantization = models.QuantizationSearchParams(
+            rescore=QDRANT_RESCORE,
+            oversampling=QDRANT_OVERSAMPLING,
+        )
+    if QDRANT_HNSW_EF is None and quantization is None:
+        return None
+    return models.SearchParams(hnsw_ef=QDRANT_HNSW_EF, quantization=quantization)
 
-def upsert_chunk(workspace_id: str, vector: List[float], payload: Dict[str, Any]) -> None:
-    ensure_collection()
 
+def _workspace_index_schema() -> models.KeywordIndexParams:
+    return models.KeywordIndexParams(
+        type=models.KeywordIndexType.KEYWORD,
+        is_tenant=QDRANT_TENANT_INDEX,
+    )
+
+
+def _collection_updates(info: models.CollectionInfo) -> Dict[str, Any]:
+    """
+    Settings an existing collection is missing compared to the configuration,
+    as update_collection kwargs. Empty when nothing needs to change.
+    """
+    updates: Dict[str, Any] = {}
+    quantization = _quantization_config()
+    if quantization is not None and info.config.quantization_config != quantization:
+        updates["quantization_config"] = quantization
+
+    hnsw = _hnsw_config()
+    if hnsw is not None:
+        current = info.config.hnsw_config
+        if any(getattr(current, k) != v for k, v in hnsw.model_dump(exclude_none=True).items()):
+            updates["hnsw_config"] = hnsw
+    return updates
+
+
+def _make_point(workspace_id: str, vector: List[float], payload: Dict[str, Any]) -> models.PointStruct:
     payload = dict(payload)
     payload["workspace_id"] = workspace_id
+    return models.PointStruct(
+        id=payload.get("chunk_id") or str(uuid4()),
+        vector=vector,
+        payload=payload,
+    )
 
-    _client.upsert(
-        collection_name=QDRANT_COLLECTION,
-        points=[
-            models.PointStruct(
-                id=str(uuid4()),
-                vector=vector,
-                payload=payload,
+
+def _workspace_filter(workspace_id: str) -> models.Filter:
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key="workspace_id",
+                match=models.MatchValue(value=workspace_id),
             )
-        ],
+        ]
     )
 
 
-def search_chunks(
-    workspace_id: str,
-    query_vector: List[float],
-    limit: int = 5,
-) -> List[Dict[str, Any]]:
-    ensure_collection()
-
-    results = _client.search(
-        collection_name=QDRANT_COLLECTION,
-        query_vector=query_vector,
-        query_filter=models.Filter(
-            must=[
-                models.FieldCondition(
-                    key="workspace_id",
-                    match=models.MatchValue(value=workspace_id),
-                )
-            ]
-        ),
-        limit=limit,
-    )
+def _query_requests(workspace_id: str, query_vectors: List[List[float]], limit: int) -> List[models.QueryRequest]:
+    query_filter = _workspace_filter(workspace_id)
+    params = _search_params()
+    return [
+        models.QueryRequest(
+            query=vector,
+            filter=query_filter,
+            params=params,
+            limit=limit,
+            with_payload=True,
+        )
+        for vector in query_vectors
+    ]
+
+
+class QdrantVectorStore(VectorStore):
+    """
+    Stores all workspaces in one Qdrant collection, filtered by workspace_id.
+    The client is created on first use. Against a server every call goes
+    through the async client; in embedded mode (QDRANT_PATH) the local storage
+    can have a single owner and its work is CPU-bound, so the sync client is
+    opened instead and each call is offloaded to a thread.
+    """
+
+    def __init__(
+        self,
+        url: str = QDRANT_URL,
+        api_key: str = QDRANT_API_KEY,
+        path: str = QDRANT_PATH,
+        collection: str = QDRANT_COLLECTION,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.path = path
+        self.collection = collection
+        self._client: Optional[QdrantClient] = None
+        self._async_client: Optional[AsyncQdrantClient] = None
+        self._collection_ready = False
+
+    def _embedded_client(self) -> QdrantClient:
+        if self._client is None:
+            if self.path == ":memory:":
+                self._client = QdrantClient(location=":memory:")
+            else:
+                self._client = QdrantClient(path=self.path)
+        return self._client
+
+    async def _call(self, method: str, **kwargs: Any) -> Any:
+        if self.path:
+            return await asyncio.to_thread(getattr(self._embedded_client(), method), **kwargs)
+        if self._async_client is None:
+            self._async_client = AsyncQdrantClient(url=self.url, api_key=self.api_key)
+        return await getattr(self._async_client, method)(**kwargs)
+
+    async def awarm_up(self) -> None:
+        """Connect and verify (or create) the collection once, off the request path."""
+        await self.aensure_collection()
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        self._collection_ready = False
+
+    async def aensure_collection(self) -> None:
+        if self._collection_ready:
+            return
+        if await self._call("collection_exists", collection_name=self.collection):
+            await self.amigrate_collection()
+        else:
+            await self._call(
+                "create_collection",
+                collection_name=self.collection,
+                vectors_config=_vectors_config(),
+                hnsw_config=_hnsw_config(),
+                quantization_config=_quantization_config(),
+            )
+            await self._call(
+                "create_payload_index",
+                collection_name=self.collection,
+                field_name="workspace_id",
+                field_schema=_workspace_index_schema(),
+            )
+        self._collection_ready = True
+
+    async def amigrate_collection(self) -> None:
+        """
+        Bring an existing collection in line with the configured quantization,
+        HNSW settings and workspace_id index. Qdrant rebuilds the affected
+        segments in the background, so this is safe to run on a live collection.
+        """
+        info = await self._call("get_collection", collection_name=self.collection)
+        updates = _collection_updates(info)
+        if updates:
+            await self._call("update_collection", collection_name=self.collection, **updates)
+        if "workspace_id" not in (info.payload_schema or {}):
+            await self._call(
+                "create_payload_index",
+                collection_name=self.collection,
+                field_name="workspace_id",
+                field_schema=_workspace_index_schema(),
+            )
+
+    async def aupsert(self, workspace_id: str, items: List[Tuple[List[float], Dict[str, Any]]]) -> None:
+        if not items:
+            return
+        await self.aensure_collection()
+
+        await self._call(
+            "upsert",
+            collection_name=self.collection,
+            points=[_make_point(workspace_id, vector, payload) for vector, payload in items],
+        )
+
+    async def asearch(self, workspace_id: str, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+        await self.aensure_collection()
+
+        request = _query_requests(workspace_id, [query_vector], limit)[0]
+        response = await self._call(
+            "query_points",
+            collection_name=self.collection,
+            query=request.query,
+            query_filter=request.filter,
+            search_params=request.params,
+            limit=request.limit,
+            with_payload=request.with_payload,
+        )
+
+        return [dict(hit.payload or {}, score=hit.score) for hit in response.points]
+
+    async def asearch_batch(
+        self, workspace_id: str, query_vectors: List[List[float]], limit: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        if not query_vectors:
+            return []
+        await self.aensure_collection()
+
+        responses = await self._call(
+            "query_batch_points",
+            collection_name=self.collection,
+            requests=_query_requests(workspace_id, query_vectors, limit),
+        )
+        return [[dict(hit.payload or {}, score=hit.score) for hit in resp.points] for resp in responses]
+
+    async def aupdate_payloads(self, workspace_id: str, updates: Dict[str, Dict[str, Any]]) -> None:
+        if not updates:
+            return
+        await self.aensure_collection()
+        await self._call(
+            "batch_update_points",
+            collection_name=self.collection,
+            update_operations=[
+                models.SetPayloadOperation(set_payload=models.SetPayload(payload=fields, points=[chunk_id]))
+                for chunk_id, fields in updates.items()
+            ],
+        )
+
+    async def adelete(self, workspace_id: str, chunk_ids: List[str]) -> None:
+        if not chunk_ids:
+            return
+        await self.aensure_collection()
+        await self._call(
+            "delete",
+            collection_name=self.collection,
+            points_selector=models.PointIdsList(points=list(chunk_ids)),
+        )
+
+
+async def _apply_settings() -> None:
+    store = QdrantVectorStore()
+    try:
+        await store.aensure_collection()
+    finally:
+        await store.aclose()
+
 
-    return [hit.payload for hit in results]
+if __name__ == "__main__":
+    # python -m services.qdrant_client: apply the configured collection settings
+    asyncio.run(_apply_settings())
@@ -0,0 +1,24 @@
+import asyncio
+import time
+
+
+class RateLimiter:
+    """
+    Async limiter that spaces calls so no more than ``per_minute`` start in
+    any minute. A limit of 0 or less disables it.
+    """
+
+    def __init__(self, per_minute: float = 0):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
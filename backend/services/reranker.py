@@ -0,0 +1,84 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from services.chunker import count_tokens
+from services.lexical_index import tokenize
+from services.metrics import stage
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") in ("1", "true", "True")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_MAX_K = int(os.getenv("RERANK_MAX_K", "8"))
+# Keep chunks scoring at least this fraction of the best chunk's score
+RERANK_MIN_SCORE_RATIO = float(os.getenv("RERANK_MIN_SCORE_RATIO", "0.5"))
+# Upper bound on context tokens sent to the answer model
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Weight of the lexical overlap score against the dense similarity score
+RERANK_LEXICAL_WEIGHT = float(os.getenv("RERANK_LEXICAL_WEIGHT", "0.5"))
+
+
+def overlap_score(query_terms: List[str], text: str) -> float:
+    """
+    Fraction of the query's terms (and adjacent term pairs) found in the text.
+    """
+    if not query_terms:
+        return 0.0
+    doc_terms = tokenize(text)
+    doc_set = set(doc_terms)
+    unigrams = set(query_terms)
+    score = len(unigrams & doc_set) / len(unigrams)
+
+    pairs = set(zip(query_terms, query_terms[1:]))
+    if pairs:
+        doc_pairs = set(zip(doc_terms, doc_terms[1:]))
+        score = 0.7 * score + 0.3 * len(pairs & doc_pairs) / len(pairs)
+    return score
+
+
+def rerank(question: str, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Re-score retrieved hits by blending their dense similarity ("score", when
+    present) with lexical overlap against the question, best first. Each
+    returned hit gets a "rerank_score".
+    """
+    with stage("rerank"):
+        query_terms = tokenize(question)
+        rescored = []
+        for hit in hits:
+            dense = hit.get("score")
+            lexical = overlap_score(query_terms, hit.get("text", ""))
+            if dense is None:
+                combined = lexical
+            else:
+                combined = (1.0 - RERANK_LEXICAL_WEIGHT) * float(dense) + RERANK_LEXICAL_WEIGHT * lexical
+            rescored.append(dict(hit, rerank_score=combined))
+        rescored.sort(key=lambda h: h["rerank_score"], reverse=True)
+        return rescored
+
+
+def select_chunks(
+    hits: List[Dict[str, Any]],
+    max_k: int = RERANK_MAX_K,
+    min_score_ratio: float = RERANK_MIN_SCORE_RATIO,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    score_key: str = "rerank_score",
+) -> List[Dict[str, Any]]:
+    """
+    Adaptive top-k over hits sorted best first: stop at ``max_k``, at the
+    first hit scoring below ``min_score_ratio`` of the best one, or when the
+    next chunk would exceed ``token_budget``. The best hit is always kept.
+    """
+    if not hits:
+        return []
+    best: Optional[float] = hits[0].get(score_key)
+    selected: List[Dict[str, Any]] = []
+    used = 0
+    for hit in hits[:max_k]:
+        score = hit.get(score_key)
+        if selected and best is not None and score is not None and score < best * min_score_ratio:
+            break
+        tokens = count_tokens(hit.get("text", ""))
+        if selected and used + tokens > token_budget:
+            break
+        selected.append(hit)
+        used += tokens
+    return selected
@@ -0,0 +1,479 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services.chunk_store import get_chunk_store
+from services.metrics import stage
+
+VECTOR_SIZE = 768  # must match text-embedding-004
+
+# "qdrant" (server or embedded via QDRANT_PATH) or "local" (NumPy, in-process)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant")
+LOCAL_VECTOR_DIR = os.getenv("LOCAL_VECTOR_DIR", ".cache/vectors")
+# Rewrite a local workspace's files once this fraction of its rows is dead
+LOCAL_VECTOR_COMPACT_RATIO = float(os.getenv("LOCAL_VECTOR_COMPACT_RATIO", "0.3"))
+_ROW_BYTES = VECTOR_SIZE * 4
+
+# Keep chunk text in vector payloads too (the pre-chunk-store layout)
+CHUNK_TEXT_IN_PAYLOAD = os.getenv("CHUNK_TEXT_IN_PAYLOAD", "0") in ("1", "true", "True")
+
+UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+UPSERT_BATCH_BYTES = int(os.getenv("QDRANT_UPSERT_BATCH_BYTES", str(4 * 1024 * 1024)))
+
+
+class VectorStore:
+    """
+    Storage for chunk vectors and payloads, partitioned by workspace.
+    Backends implement either the sync upsert/search/delete, which the async
+    variants run in a worker thread by default, or the async variants
+    directly. search_batch defaults to one search per query.
+    """
+
+    def upsert(self, workspace_id: str, items: List[Tuple[List[float], Dict[str, Any]]]) -> None:
+        raise NotImplementedError
+
+    def search(self, workspace_id: str, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def search_batch(
+        self, workspace_id: str, query_vectors: List[List[float]], limit: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        return [self.search(workspace_id, vector, limit) for vector in query_vectors]
+
+    def delete(self, workspace_id: str, chunk_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def update_payloads(self, workspace_id: str, updates: Dict[str, Dict[str, Any]]) -> None:
+        """Merge fields into the payloads of existing points, keyed by chunk id, keeping their vectors."""
+        raise NotImplementedError
+
+    async def aupdate_payloads(self, workspace_id: str, updates: Dict[str, Dict[str, Any]]) -> None:
+        await asyncio.to_thread(self.update_payloads, workspace_id, updates)
+
+    async def adelete(self, workspace_id: str, chunk_ids: List[str]) -> None:
+        await asyncio.to_thread(self.delete, workspace_id, chunk_ids)
+
+    async def aupsert(self, workspace_id: str, items: List[Tuple[List[float], Dict[str, Any]]]) -> None:
+        await asyncio.to_thread(self.upsert, workspace_id, items)
+
+    async def asearch(self, workspace_id: str, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.search, workspace_id, query_vector, limit)
+
+    async def asearch_batch(
+        self, workspace_id: str, query_vectors: List[List[float]], limit: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self.search_batch, workspace_id, query_vectors, limit)
+
+    async def awarm_up(self) -> None:
+        """Open connections and verify storage before the first request; raises if unavailable."""
+
+    async def aclose(self) -> None:
+        pass
+
+
+class _LocalWorkspace:
+    """
+    One workspace on disk: raw float32 vector rows, a JSONL line of payload
+    per row, and a log of deleted row numbers. Vectors are appended before
+    payloads, so a crash in between leaves extra vector rows (or a torn last
+    line) that are trimmed on load. Once dead rows pass
+    LOCAL_VECTOR_COMPACT_RATIO the live ones are rewritten to new files; a
+    marker file makes the swap all-or-nothing across a crash.
+    """
+
+    def __init__(self, directory: str):
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.payloads_path = os.path.join(directory, "payloads.jsonl")
+        self.deleted_path = os.path.join(directory, "deleted_rows")
+        self.compact_marker = os.path.join(directory, "compacting")
+        self.matrix: Optional[np.ndarray] = None
+        self.payloads: List[Dict[str, Any]] = []
+        self.alive: Optional[np.ndarray] = None
+        self._alive: List[bool] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._finish_compaction()
+        self._track(self._load_rows())
+        if os.path.exists(self.deleted_path):
+            with open(self.deleted_path, encoding="utf-8") as f:
+                self._kill([int(line) for line in f if line.strip()])
+        self._map()
+
+    def _load_rows(self) -> List[Dict[str, Any]]:
+        """Payloads of the rows that have a vector, trimming what a crash left half-written."""
+        payloads: List[Dict[str, Any]] = []
+        ends: List[int] = []
+        if os.path.exists(self.payloads_path):
+            end = 0
+            with open(self.payloads_path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    if line.strip():
+                        try:
+                            payloads.append(json.loads(line))
+                        except ValueError:
+                            break
+                        ends.append(end + len(line))
+                    end += len(line)
+        vector_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        rows = min(len(payloads), vector_bytes // _ROW_BYTES)
+        _truncate(self.vectors_path, rows * _ROW_BYTES)
+        _truncate(self.payloads_path, ends[rows - 1] if rows else 0)
+        return payloads[:rows]
+
+    def _track(self, payloads: List[Dict[str, Any]]) -> None:
+        # A re-upserted chunk id supersedes its earlier row
+        for payload in payloads:
+            row = len(self.payloads)
+            self.payloads.append(payload)
+            self._alive.append(True)
+            chunk_id = payload.get("chunk_id")
+            if chunk_id:
+                old = self._row_by_id.get(chunk_id)
+                if old is not None:
+                    self._alive[old] = False
+                self._row_by_id[chunk_id] = row
+
+    def _kill(self, rows: List[int]) -> None:
+        for row in rows:
+            if row < len(self._alive):
+                self._alive[row] = False
+                chunk_id = self.payloads[row].get("chunk_id")
+                if chunk_id and self._row_by_id.get(chunk_id) == row:
+                    del self._row_by_id[chunk_id]
+
+    def _map(self) -> None:
+        rows = len(self.payloads)
+        if rows and os.path.exists(self.vectors_path):
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, VECTOR_SIZE))
+        else:
+            self.matrix = None
+        self.alive = np.asarray(self._alive, dtype=bool)
+
+    def append(self, vectors: np.ndarray, payloads: List[Dict[str, Any]]) -> None:
+        os.makedirs(os.path.dirname(self.vectors_path), exist_ok=True)
+        # Drop the old mapping before growing the file underneath it
+        self.matrix = None
+        with open(self.vectors_path, "ab") as f:
+            f.write(vectors.astype(np.float32, copy=False).tobytes())
+        with open(self.payloads_path, "a", encoding="utf-8") as f:
+            for payload in payloads:
+                f.write(json.dumps(payload) + "\n")
+        self._track(payloads)
+        self._map()
+
+    def delete(self, chunk_ids: List[str]) -> None:
+        rows = [self._row_by_id[c] for c in chunk_ids if c in self._row_by_id]
+        if not rows:
+            return
+        with open(self.deleted_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{row}\n" for row in rows))
+        self._kill(rows)
+        self.alive = np.asarray(self._alive, dtype=bool)
+
+    def update(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        # Payload lines are append-only, so an updated point is written again
+        # with its vector and supersedes the old row
+        rows = [(self._row_by_id[c], fields) for c, fields in updates.items() if c in self._row_by_id]
+        if not rows:
+            return
+        vectors = np.array(self.matrix[[row for row, _ in rows]])
+        self.append(vectors, [dict(self.payloads[row], **fields) for row, fields in rows])
+
+    def needs_compaction(self) -> bool:
+        rows = len(self._alive)
+        return rows > 0 and (rows - int(self.alive.sum())) / rows >= LOCAL_VECTOR_COMPACT_RATIO
+
+    def compact(self) -> None:
+        """Rewrite the files with only the live rows, dropping deleted and superseded ones."""
+        live = np.flatnonzero(self.alive)
+        payloads = [self.payloads[row] for row in live]
+        with open(self.vectors_path + ".compact", "wb") as f:
+            for start in range(0, len(live), 4096):
+                f.write(np.ascontiguousarray(self.matrix[live[start:start + 4096]]).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.payloads_path + ".compact", "w", encoding="utf-8") as f:
+            for payload in payloads:
+                f.write(json.dumps(payload) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        open(self.compact_marker, "w").close()
+        # Searches already running keep their mapping of the old file
+        self.matrix = None
+        self._finish_compaction()
+        self.payloads, self._alive, self._row_by_id = [], [], {}
+        self._track(payloads)
+        self._map()
+
+    def _finish_compaction(self) -> None:
+        # With the marker both rewritten files are complete and get swapped
+        # in; without it a rewrite was interrupted and is thrown away
+        done = os.path.exists(self.compact_marker)
+        for path in (self.vectors_path, self.payloads_path):
+            if os.path.exists(path + ".compact"):
+                if done:
+                    os.replace(path + ".compact", path)
+                else:
+                    os.remove(path + ".compact")
+        if done:
+            if os.path.exists(self.deleted_path):
+                os.remove(self.deleted_path)
+            os.remove(self.compact_marker)
+
+
+def _truncate(path: str, size: int) -> None:
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        os.truncate(path, size)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process backend for small or offline workspaces. Each workspace is a
+    float32 matrix of unit-normalized vectors memory-mapped from disk, so
+    cosine top-k is a single matmul plus argpartition.
+    """
+
+    def __init__(self, directory: str = LOCAL_VECTOR_DIR):
+        self.directory = directory
+        self._workspaces: Dict[str, _LocalWorkspace] = {}
+        self._lock = threading.Lock()
+
+    def _workspace(self, workspace_id: str) -> _LocalWorkspace:
+        ws = self._workspaces.get(workspace_id)
+        if ws is None:
+            safe = re.sub(r"[^A-Za-z0-9_.-]", "_", workspace_id)[:64]
+            digest = hashlib.sha1(workspace_id.encode("utf-8")).hexdigest()[:8]
+            ws = _LocalWorkspace(os.path.join(self.directory, f"{safe}-{digest}"))
+            self._workspaces[workspace_id] = ws
+        return ws
+
+    def upsert(self, workspace_id: str, items: List[Tuple[List[float], Dict[str, Any]]]) -> None:
+        if not items:
+            return
+        vectors = _normalize(np.asarray([vector for vector, _ in items], dtype=np.float32))
+        payloads = []
+        for _, payload in items:
+            payload = dict(payload)
+            payload["workspace_id"] = workspace_id
+            payloads.append(payload)
+        with self._lock:
+            ws = self._workspace(workspace_id)
+            ws.append(vectors, payloads)
+            if ws.needs_compaction():
+                ws.compact()
+
+    def search(self, workspace_id: str, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+        return self.search_batch(workspace_id, [query_vector], limit)[0]
+
+    def search_batch(
+        self, workspace_id: str, query_vectors: List[List[float]], limit: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        """All queries are scored against the workspace in one matrix product."""
+        with self._lock:
+            ws = self._workspace(workspace_id)
+            matrix, payloads, alive = ws.matrix, ws.payloads, ws.alive
+        if matrix is None or limit <= 0 or not query_vectors:
+            return [[] for _ in query_vectors]
+        limit = min(limit, int(alive.sum()))
+        if not limit:
+            return [[] for _ in query_vectors]
+
+        queries = _normalize(np.asarray(query_vectors, dtype=np.float32))
+        scores = queries @ matrix.T
+        scores[:, ~alive] = -np.inf
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, limit - 1)[:limit]
+            top = top[np.argsort(-row[top])]
+            results.append([dict(payloads[i], score=float(row[i])) for i in top])
+        return results
+
+    def delete(self, workspace_id: str, chunk_ids: List[str]) -> None:
+        with self._lock:
+            ws = self._workspace(workspace_id)
+            ws.delete(chunk_ids)
+            if ws.needs_compaction():
+                ws.compact()
+
+    def update_payloads(self, workspace_id: str, updates: Dict[str, Dict[str, Any]]) -> None:
+        if not updates:
+            return
+        with self._lock:
+            ws = self._workspace(workspace_id)
+            ws.update(updates)
+            if ws.needs_compaction():
+                ws.compact()
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    global _store
+    if _store is None:
+        if VECTOR_STORE == "local":
+            _store = LocalVectorStore()
+        else:
+            from services.qdrant_client import QdrantVectorStore
+
+            _store = QdrantVectorStore()
+    return _store
+
+
+def set_vector_store(store: VectorStore) -> None:
+    global _store
+    _store = store
+
+
+async def aupsert_chunks(workspace_id: str, items: List[Tuple[List[float], Dict[str, Any]]]) -> None:
+    """
+    Upsert many (vector, payload) pairs for a workspace in a single request.
+    Payloads carrying a chunk_id have their text moved to the chunk store.
+    """
+    with stage("vector_upsert"):
+        items = await asyncio.to_thread(_store_texts, workspace_id, items)
+        await get_vector_store().aupsert(workspace_id, items)
+
+
+async def asearch_chunks(
+    workspace_id: str,
+    query_vector: List[float],
+    limit: int = 5,
+) -> List[Dict[str, Any]]:
+    with stage("vector_search"):
+        hits = await get_vector_store().asearch(workspace_id, query_vector, limit)
+    with stage("chunk_text_load"):
+        return await asyncio.to_thread(_load_texts, hits)
+
+
+async def asearch_chunks_batch(
+    workspace_id: str,
+    query_vectors: List[List[float]],
+    limit: int = 5,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Search many query vectors in one request; returns one hit list per query.
+    Chunk texts for all of them are loaded with a single chunk store lookup.
+    """
+    with stage("vector_search_batch"):
+        batches = await get_vector_store().asearch_batch(workspace_id, query_vectors, limit)
+    with stage("chunk_text_load"):
+        return await asyncio.to_thread(_load_texts_batch, batches)
+
+
+async def aupdate_chunks(workspace_id: str, updates: Dict[str, Dict[str, Any]]) -> None:
+    """Merge fields such as chunk_index into existing chunk payloads without re-embedding them."""
+    if not updates:
+        return
+    with stage("vector_update"):
+        await get_vector_store().aupdate_payloads(workspace_id, updates)
+
+
+async def adelete_chunks(workspace_id: str, chunk_ids: List[str]) -> None:
+    if not chunk_ids:
+        return
+    with stage("vector_delete"):
+        await get_vector_store().adelete(workspace_id, chunk_ids)
+        await asyncio.to_thread(get_chunk_store().delete_many, chunk_ids)
+
+
+def _store_texts(
+    workspace_id: str, items: List[Tuple[List[float], Dict[str, Any]]]
+) -> List[Tuple[List[float], Dict[str, Any]]]:
+    get_chunk_store().put_many(
+        workspace_id,
+        [(p["chunk_id"], p.get("text", "")) for _, p in items if p.get("chunk_id")],
+    )
+    if CHUNK_TEXT_IN_PAYLOAD:
+        return items
+    return [
+        (vector, {k: v for k, v in payload.items() if k != "text"} if payload.get("chunk_id") else payload)
+        for vector, payload in items
+    ]
+
+
+def _load_texts(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Older points still carry their text; only fetch the ones that do not
+    missing = [hit["chunk_id"] for hit in hits if "text" not in hit and hit.get("chunk_id")]
+    if not missing:
+        return hits
+    texts = get_chunk_store().get_many(missing)
+    return [
+        dict(hit, text=texts.get(hit.get("chunk_id"), "")) if "text" not in hit else hit
+        for hit in hits
+    ]
+
+
+def _load_texts_batch(batches: List[List[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+    loaded = iter(_load_texts([hit for hits in batches for hit in hits]))
+    return [[next(loaded) for _ in hits] for hits in batches]
+
+
+class ChunkWriter:
+    """
+    Buffers chunk points for one workspace and upserts them in batches,
+    flushing whenever the pending count or approximate request size reaches
+    its limit. Use as an async context manager so the tail is flushed on
+    exit. ``on_flush`` is called with the workspace id and the batch's
+    payloads after each batch lands in Qdrant.
+    """
+
+    def __init__(
+        self,
+        workspace_id: str,
+        batch_size: int = UPSERT_BATCH_SIZE,
+        batch_bytes: int = UPSERT_BATCH_BYTES,
+        on_flush: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None,
+    ):
+        self.workspace_id = workspace_id
+        self.on_flush = on_flush
+        self.batch_size = max(1, batch_size)
+        self.batch_bytes = max(1, batch_bytes)
+        self.written = 0
+        self._pending: List[Tuple[List[float], Dict[str, Any]]] = []
+        self._pending_bytes = 0
+
+    async def aadd(self, vector: List[float], payload: Dict[str, Any]) -> None:
+        if self._buffer(vector, payload):
+            await self.aflush()
+
+    async def aflush(self) -> None:
+        if not self._pending:
+            return
+        await aupsert_chunks(self.workspace_id, self._pending)
+        self._mark_flushed()
+
+    def _buffer(self, vector: List[float], payload: Dict[str, Any]) -> bool:
+        """Queue a point; return True when the batch should be flushed."""
+        self._pending.append((vector, payload))
+        # Rough JSON size: ~10 bytes per float plus the serialized payload
+        self._pending_bytes += len(vector) * 10 + len(json.dumps(payload, default=str))
+        return len(self._pending) >= self.batch_size or self._pending_bytes >= self.batch_bytes
+
+    def _mark_flushed(self) -> None:
+        flushed = self._pending
+        self.written += len(flushed)
+        self._pending = []
+        self._pending_bytes = 0
+        if self.on_flush is not None:
+            self.on_flush(self.workspace_id, [payload for _, payload in flushed])
+
+    async def __aenter__(self) -> "ChunkWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.aflush()
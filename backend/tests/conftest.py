@@ -0,0 +1,55 @@
+import hashlib
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+_DATA_DIR = tempfile.mkdtemp(prefix="autorag-tests-")
+os.environ.update(
+    VECTOR_STORE="local",
+    LOCAL_VECTOR_DIR=os.path.join(_DATA_DIR, "vectors"),
+    CHUNK_STORE_PATH=os.path.join(_DATA_DIR, "chunks.sqlite3"),
+    CONTENT_CACHE_PATH=os.path.join(_DATA_DIR, "content_cache.sqlite3"),
+    JOBS_DB_PATH=os.path.join(_DATA_DIR, "jobs.sqlite3"),
+    JOBS_SPOOL_DIR=os.path.join(_DATA_DIR, "job_files"),
+    LEXICAL_INDEX_DIR=os.path.join(_DATA_DIR, "lexical"),
+    JOB_WORKERS="2",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+def fake_vector(text: str):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [b / 255 for b in digest] * 24
+
+
+class FakeModels:
+    """Stands in for client.aio.models; records every text it embeds."""
+
+    def __init__(self):
+        self.embedded = []
+
+    async def embed_content(self, model, contents, config=None):
+        self.embedded.extend(contents)
+        return SimpleNamespace(embeddings=[SimpleNamespace(values=fake_vector(c)) for c in contents])
+
+    async def generate_content(self, model, contents, config=None):
+        return SimpleNamespace(text='{"answer": "ok", "confidence": 0.5, "citations": []}')
+
+
+@pytest.fixture
+def fake_models():
+    return FakeModels()
+
+
+@pytest.fixture
+def client(fake_models):
+    from fastapi.testclient import TestClient
+
+    import main
+
+    main.gemini_client.client = SimpleNamespace(aio=SimpleNamespace(models=fake_models))
+    with TestClient(main.app) as test_client:
+        yield test_client
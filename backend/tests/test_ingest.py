@@ -0,0 +1,88 @@
+import time
+
+import main
+from services.chunk_store import get_chunk_store
+from services.jobs import JobStore
+from services.vector_store import get_vector_store
+
+
+def _document(paragraphs):
+    return "\n\n".join(f"Paragraph {p} " + "lorem ipsum " * 120 for p in paragraphs).encode()
+
+
+def _upload(client, workspace_id, data, wait=True):
+    files = [("files", ("doc.txt", data, "text/plain"))]
+    resp = client.post(f"/api/workspaces/{workspace_id}/upload", params={"wait": wait}, files=files)
+    assert resp.status_code in (200, 202), resp.text
+    return resp.json()
+
+
+def _live_payloads(workspace_id):
+    workspace = get_vector_store()._workspace(workspace_id)
+    return {p["chunk_id"]: p for p, alive in zip(workspace.payloads, workspace._alive) if alive}
+
+
+def test_claim_next_runs_one_job_per_workspace(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    first = store.create_job("ws-a", [])
+    second = store.create_job("ws-a", [])
+    other = store.create_job("ws-b", [])
+
+    assert store.claim_next()["id"] == first
+    assert store.claim_next()["id"] == other
+    assert store.claim_next() is None
+
+    store.finish_job(first, "done")
+    assert store.claim_next()["id"] == second
+
+
+def test_concurrent_uploads_leave_points_matching_the_manifest(client):
+    first = _upload(client, "ws-concurrent", _document(range(8)), wait=False)
+    second = _upload(client, "ws-concurrent", _document(range(4, 12)), wait=False)
+    for job in (first, second):
+        while client.get(f"/api/jobs/{job['job_id']}").json()["status"] not in ("done", "failed"):
+            time.sleep(0.05)
+
+    manifest = get_chunk_store().get_manifest("ws-concurrent", "doc.txt")
+    assert set(manifest["chunks"]) == set(_live_payloads("ws-concurrent"))
+
+
+def test_inserted_paragraph_keeps_other_chunks(client, fake_models):
+    original = _document(range(6))
+    edited = _document(["new", 0, 1, 2, 3, 4, 5])
+    _upload(client, "ws-insert", original)
+    before = get_chunk_store().get_manifest("ws-insert", "doc.txt")["chunks"]
+
+    fake_models.embedded.clear()
+    result = _upload(client, "ws-insert", edited)
+    after = get_chunk_store().get_manifest("ws-insert", "doc.txt")["chunks"]
+
+    # Only the inserted paragraph and the chunk whose overlap it changed are new
+    old_texts = {t for _, t, _ in main._chunk_file("ws-insert", "doc.txt", original.decode())}
+    new_texts = [t for _, t, _ in main._chunk_file("ws-insert", "doc.txt", edited.decode()) if t not in old_texts]
+    assert sorted(fake_models.embedded) == sorted(new_texts)
+    assert result["chunks_indexed"] == len(new_texts)
+
+    kept = set(before) & set(after)
+    assert len(kept) >= 5
+    assert all(after[chunk_id] == before[chunk_id] + 1 for chunk_id in kept)
+
+    payloads = _live_payloads("ws-insert")
+    assert set(payloads) == set(after)
+    assert all(payloads[chunk_id]["chunk_index"] == idx for chunk_id, idx in after.items())
+
+
+def test_upload_rejects_duplicate_filenames(client):
+    files = [("files", ("doc.txt", b"one", "text/plain")), ("files", ("doc.txt", b"two", "text/plain"))]
+    resp = client.post("/api/workspaces/ws-dupes/upload", files=files)
+    assert resp.status_code == 400
+    assert "doc.txt" in resp.json()["detail"]
+
+
+def test_progress_counts_only_new_chunks(client):
+    _upload(client, "ws-progress", _document(range(6)))
+    result = _upload(client, "ws-progress", _document(range(7)))
+
+    job = client.get(f"/api/jobs/{result['job_id']}").json()
+    assert job["status"] == "done"
+    assert job["chunks_total"] == job["chunks_indexed"] == result["chunks_indexed"] > 0
@@ -1,54 +1,110 @@
 import { useEffect, useState } from "react";
 import { useNavigate, useLocation } from "react-router-dom";
-import { Sparkles, Check, Loader2 } from "lucide-react";
+import { Sparkles, Check, Loader2, AlertTriangle } from "lucide-react";
 import { Button } from "@/components/ui/button";
+import { Progress } from "@/components/ui/progress";
+
+const POLL_INTERVAL_MS = 1000;
 
 interface ProcessingStep {
   label: string;
+  detail?: string;
   status: "pending" | "processing" | "complete";
 }
 
+interface JobStatus {
+  status: "queued" | "running" | "done" | "failed";
+  error: string | null;
+  files_total: number;
+  files_done: number;
+  chunks_total: number;
+  chunks_indexed: number;
+  errors: Array<{ filename: string; error: string }>;
+}
+
+const stepStatus = (complete: boolean, active: boolean): ProcessingStep["status"] =>
+  complete ? "complete" : active ? "processing" : "pending";
+
+// Map the job's progress counters onto the pipeline steps
+const buildSteps = (job: JobStatus | null): ProcessingStep[] => {
+  const started = job !== null && job.status !== "queued";
+  const finished = job?.status === "done";
+  const filesDone = job?.files_done ?? 0;
+  const filesTotal = job?.files_total ?? 0;
+  const chunksTotal = job?.chunks_total ?? 0;
+  const chunksIndexed = job?.chunks_indexed ?? 0;
+
+  return [
+    { label: "Waiting in the processing queue", status: stepStatus(started, job !== null && !started) },
+    {
+      label: "Extracting text via Gemini (OCR, STT)",
+      detail: started ? `${filesDone}/${filesTotal} files` : undefined,
+      status: stepStatus(finished || (started && filesDone === filesTotal), started),
+    },
+    {
+      label: "Cleaning and chunking",
+      detail: chunksTotal > 0 ? `${chunksTotal} chunks` : undefined,
+      status: stepStatus(finished, started && chunksTotal > 0),
+    },
+    {
+      label: "Creating embeddings (Qdrant)",
+      detail: chunksTotal > 0 ? `${chunksIndexed}/${chunksTotal} chunks` : undefined,
+      status: stepStatus(finished, started && chunksIndexed > 0),
+    },
+    { label: "Building chat pipeline", status: stepStatus(finished, false) },
+  ];
+};
+
+const progressPercent = (job: JobStatus | null): number => {
+  if (!job) return 0;
+  if (job.status === "done") return 100;
+  if (job.chunks_total > 0) return Math.round((job.chunks_indexed / job.chunks_total) * 100);
+  return job.files_total > 0 ? Math.round((job.files_done / job.files_total) * 100) : 0;
+};
+
 const Processing = () => {
   const navigate = useNavigate();
   const location = useLocation();
-  const { assistantName, fileCount } = location.state || { assistantName: "Your Assistant", fileCount: 0 };
+  const { assistantName, fileCount, jobId } = location.state || { assistantName: "Your Assistant", fileCount: 0 };
 
-  const [steps, setSteps] = useState<ProcessingStep[]>([
-    { label: "Extracting text via Gemini (OCR, STT)", status: "pending" },
-    { label: "Cleaning and chunking", status: "pending" },
-    { label: "Creating embeddings (Qdrant)", status: "pending" },
-    { label: "Building chat pipeline", status: "pending" },
-    { label: "Generating test questions", status: "pending" },
-    { label: "Scoring your assistant", status: "pending" },
-  ]);
-
-  const [qualityScore, setQualityScore] = useState<number | null>(null);
-  const [allComplete, setAllComplete] = useState(false);
+  const [job, setJob] = useState<JobStatus | null>(null);
+  const [pollError, setPollError] = useState<string | null>(
+    jobId ? null : "No processing job was found for this upload."
+  );
 
   useEffect(() => {
-    let currentStep = 0;
-
-    const interval = setInterval(() => {
-      if (currentStep < steps.length) {
-        setSteps(prev => 
-          prev.map((step, index) => {
-            if (index < currentStep) return { ...step, status: "complete" };
-            if (index === currentStep) return { ...step, status: "processing" };
-            return step;
-          })
-        );
-        currentStep++;
-      } else {
-        clearInterval(interval);
-        // Generate quality score between 75-95
-        const score = Math.floor(Math.random() * 21) + 75;
-        setQualityScore(score);
-        setTimeout(() => setAllComplete(true), 500);
+    if (!jobId) return;
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout>;
+
+    const poll = async () => {
+      try {
+        const res = await fetch(`https://autoragos.onrender.com/api/jobs/${jobId}`);
+        if (!res.ok) {
+          throw new Error(res.status === 404 ? "Processing job not found" : "Failed to fetch progress");
+        }
+        const data: JobStatus = await res.json();
+        if (cancelled) return;
+        setJob(data);
+        setPollError(null);
+        if (data.status === "done" || data.status === "failed") return;
+      } catch (err: any) {
+        if (cancelled) return;
+        setPollError(err.message || "Failed to fetch progress");
       }
-    }, 1500);
+      timer = setTimeout(poll, POLL_INTERVAL_MS);
+    };
 
-    return () => clearInterval(interval);
-  }, []);
+    poll();
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [jobId]);
+
+  const steps = buildSteps(job);
+  const allComplete = job?.status === "done";
+  const failed = job?.status === "failed";
 
   return (
     <div className="min-h-screen bg-background">
@@ -69,6 +125,8 @@ const Processing = () => {
           </p>
         </div>
 
+        <Progress value={progressPercent(job)} className="mb-8" />
+
         {/* Progress Steps */}
         <div className="space-y-4 mb-12">
           {steps.map((step, index) => (
@@ -76,8 +134,8 @@ const Processing = () => {
               key={index}
               className={`
                 flex items-center gap-4 p-4 rounded-lg border transition-all
-                ${step.status === "complete" 
-                  ? "border-success bg-success/5" 
+                ${step.status === "complete"
+                  ? "border-success bg-success/5"
                   : step.status === "processing"
                   ? "border-primary bg-primary/5"
                   : "border-border bg-card"
@@ -100,16 +158,43 @@ const Processing = () => {
               <span className={`font-medium ${step.status === "pending" ? "text-muted-foreground" : ""}`}>
                 {step.label}
               </span>
+              {step.detail && (
+                <span className="ml-auto text-sm text-muted-foreground">{step.detail}</span>
+              )}
             </div>
           ))}
         </div>
 
-        {/* Quality Score */}
-        {qualityScore !== null && (
+        {/* Errors */}
+        {(pollError || failed || (job && job.errors.length > 0)) && (
+          <div className="mb-8 p-4 rounded-lg border border-destructive bg-destructive/5 space-y-2">
+            {pollError && (
+              <div className="flex items-center gap-2 text-sm text-destructive">
+                <AlertTriangle className="h-4 w-4 shrink-0" />
+                <span>{pollError}</span>
+              </div>
+            )}
+            {failed && job?.error && (
+              <div className="flex items-center gap-2 text-sm text-destructive">
+                <AlertTriangle className="h-4 w-4 shrink-0" />
+                <span>Processing failed: {job.error}</span>
+              </div>
+            )}
+            {job?.errors.map((e, index) => (
+              <div key={index} className="flex items-center gap-2 text-sm text-warning">
+                <AlertTriangle className="h-4 w-4 shrink-0" />
+                <span>{e.filename}: {e.error}</span>
+              </div>
+            ))}
+          </div>
+        )}
+
+        {/* Summary */}
+        {allComplete && job && (
           <div className="text-center mb-8 animate-in fade-in duration-500">
             <div className="inline-block p-8 bg-gradient-primary rounded-2xl text-white shadow-glow">
-              <p className="text-sm font-medium mb-2">RAG Quality Score</p>
-              <p className="text-5xl font-bold">{qualityScore}%</p>
+              <p className="text-sm font-medium mb-2">Chunks Indexed</p>
+              <p className="text-5xl font-bold">{job.chunks_indexed}</p>
             </div>
           </div>
         )}
@@ -120,13 +205,20 @@ const Processing = () => {
             <Button
               variant="hero"
               size="lg"
-              onClick={() => navigate("/chat", { state: { assistantName, qualityScore } })}
+              onClick={() => navigate("/chat", { state: { assistantName } })}
               className="text-lg px-8"
             >
               Start Chatting with {assistantName}
             </Button>
           </div>
         )}
+        {(failed || !jobId) && (
+          <div className="text-center">
+            <Button variant="outline" size="lg" onClick={() => navigate("/workspace")}>
+              Back to Setup
+            </Button>
+          </div>
+        )}
       </main>
     </div>
   );
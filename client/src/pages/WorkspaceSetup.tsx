@@ -120,7 +120,7 @@ const WorkspaceSetup = () => {
 
       toast({
         title: "Success",
-        description: `Uploaded and processed ${data.chunks_indexed} chunks.`,
+        description: `Uploaded ${files.length} files. Processing has started.`,
       });
 
       navigate("/processing", {
@@ -128,6 +128,7 @@ const WorkspaceSetup = () => {
           assistantName,
           description,
           fileCount: files.length,
+          jobId: data.job_id,
         },
       });
     } catch (err: any) {